@@ -31,8 +31,13 @@
 ########################################################################
 
 from .utils import *
+from .utils import LRUCache
+
+import copy
 from .protocols import ECU
 from .OBDResponse import OBDResponse
+from .decoders import compile_decoder
+from .UnitsAndScaling import Unit
 
 import logging
 
@@ -47,7 +52,8 @@ class OBDCommand():
                  _bytes,
                  decoder,
                  ecu=ECU.ALL,
-                 fast=False):
+                 fast=False,
+                 cache_size=0):
         self.name      = name        # human readable name (also used as key in commands dict)
         self.desc      = desc        # human readable description
         self.command   = command     # command string
@@ -55,6 +61,9 @@ class OBDCommand():
         self.decode    = decoder     # decoding function
         self.ecu       = ecu         # ECU ID from which this command expects messages from
         self.fast      = fast        # can an extra digit be added to the end of the command? (to make the ELM return early)
+        self.__compiled = None       # (decoder, raw decoder) pair, built on first use
+        self.__cache    = None       # LRU of decoded values, keyed on payload
+        self.set_cache(cache_size)
 
     def clone(self):
         return OBDCommand(self.name,
@@ -63,7 +72,40 @@ class OBDCommand():
                           self.bytes,
                           self.decode,
                           self.ecu,
-                          self.fast)
+                          self.fast,
+                          self.cache_size)
+
+    @property
+    def cache_size(self):
+        return 0 if self.__cache is None else self.__cache.maxsize
+
+    def set_cache(self, size):
+        """
+            Remembers the values decoded from the last <size> distinct
+            payloads, and reuses them when the same payload is received
+            again (size=0 disables the cache). Each response still gets
+            its own value, so changing one doesn't affect the others.
+        """
+        self.__cache = LRUCache(size) if size > 0 else None
+
+    def cache_stats(self):
+        """ returns the hits, misses and hit rate of the value cache """
+        if self.__cache is None:
+            return {}
+        hits = self.__cache.hits
+        misses = self.__cache.misses
+        return {
+            "size"     : len(self.__cache),
+            "maxsize"  : self.__cache.maxsize,
+            "hits"     : hits,
+            "misses"   : misses,
+            "hit_rate" : float(hits) / (hits + misses) if (hits + misses) else 0.0,
+        }
+
+    @property
+    def unit(self):
+        """ name of the (pint) unit of this command's values, if it has one """
+        return getattr(self.decode, "unit", None)
 
     @property
     def mode(self):
@@ -82,7 +124,7 @@ class OBDCommand():
             return None
 
 
-    def __call__(self, messages):
+    def __call__(self, messages, units=True):
 
         # filter for applicable messages (from the right ECU(s))
         for_us = lambda m: (self.ecu & m.ecu) > 0
@@ -96,13 +138,79 @@ class OBDCommand():
         # and reference to original command
         r = OBDResponse(self, messages)
         if messages:
-            r.value = self.decode(messages)
+            if self.__cache is None:
+                r.value = self.__decode(messages, units)
+            else:
+                r.value = self.__cached_decode(messages, units)
         else:
             logger.info(str(self) + " did not recieve any acceptable messages")
 
         return r
 
 
+    def __cached_decode(self, messages, units):
+        """
+            Decodes through the value cache. The cached values are never
+            handed out: numbers with units are cached as plain numbers
+            (and wrapped in a new Quantity), and other values are copied.
+            Status and Monitor copies share the decoded bytes, and build
+            their own tests when they're read.
+        """
+        unit = self.unit
+
+        # non-OBD responses (ie: ATRV) have no data, so use their text
+        key = (self.decode, unit is None and units) + tuple([ bytes(m.data) or m.raw() for m in messages ])
+        value = self.__cache.get(key, _MISSING)
+        if value is _MISSING:
+            value = self.__decode(messages, False if unit else units)
+            self.__cache.put(key, value)
+
+        if unit is None:
+            return copy.copy(value)
+        elif units and (value is not None):
+            return Unit.Quantity(value, unit)
+        else:
+            return value # a plain (immutable) number
+
+
+    def __decode(self, messages, units):
+        unit = self.unit
+        if unit is None:
+            # decoders without a single unit (ie: mode 06 monitors) may still have a .raw
+            return (self.decode if units else getattr(self.decode, "raw", self.decode))(messages)
+
+        # decoders that build pint Quantities can skip them (see decoders.scaled())
+        value = self.__raw_decoder()(messages)
+        if units and (value is not None):
+            value = Unit.Quantity(value, unit)
+        return value
+
+
+    def decode_batch(self, payloads):
+        """
+            Decodes many responses to this command at once, from a 2-D array
+            of payloads (one message's data per row). Returns a NumPy array
+            of plain numbers, and a mask of the valid rows. Requires numpy.
+        """
+        from .protocols.batch import decode_payloads
+        return decode_payloads(self, payloads)
+
+
+    def __raw_decoder(self):
+        """
+            returns the decoder's plain number version, compiled for this
+            command's data size when possible (see decoders.compile_decoder())
+        """
+        if (self.__compiled is None) or (self.__compiled[0] is not self.decode):
+            raw = None
+            if self.bytes > 0:
+                raw = compile_decoder(self.decode, self.bytes)
+            if raw is None:
+                raw = self.decode.raw
+            self.__compiled = (self.decode, raw)
+        return self.__compiled[1]
+
+
     def __constrain_message_data(self, message):
         """ pads or chops the data field to the size specified by this command """
         if self.bytes > 0:
@@ -120,7 +228,7 @@ class OBDCommand():
         return "%s: %s" % (self.command, self.desc)
 
     def __hash__(self):
-        # needed for using commands as keys in a dict (see async.py)
+        # needed for using commands as keys in a dict (see asynchronous.py)
         return hash(self.command)
 
     def __eq__(self, other):
@@ -128,3 +236,6 @@ class OBDCommand():
             return (self.command == other.command)
         else:
             return False
+
+
+_MISSING = object()
@@ -31,8 +31,10 @@
 ########################################################################
 
 
+import copy
 import time
 from .codes import *
+from .UnitsAndScaling import is_quantity
 
 import logging
 
@@ -52,10 +54,12 @@ class OBDResponse():
     @property
     def unit(self):
         # for backwards compatibility
-        if isinstance(self.value, Unit.Quantity):
+        if is_quantity(self.value):
             return str(self.value.u)
         elif self.value == None:
             return None
+        elif (self.command is not None) and (self.command.unit is not None):
+            return self.command.unit # plain number from OBD(units=False)
         else:
             return str(type(self.value))
 
@@ -74,21 +78,59 @@ class OBDResponse():
 
 
 class Status():
-    def __init__(self):
+    """
+        Readiness status (PID 0101). The tests are built from the decoded
+        bits when they're first looked up by name. Standard tests that
+        don't apply to this vehicle read as null tests.
+    """
+
+    __slots__ = ("MIL", "DTC_count", "ignition_type", "_bits", "_layout", "_tests")
+
+    def __init__(self, bits=None, layout=None):
         self.MIL           = False
         self.DTC_count     = 0
         self.ignition_type = ""
-
-        # make sure each test is available by name
-        # until real data comes it. This also prevents things from
-        # breaking when the user looks up a standard test that's null.
-        null_test = StatusTest()
-        for name in BASE_TESTS + SPARK_TESTS + COMPRESSION_TESTS:
-            if name: # filter out None/reserved tests
-                self.__dict__[name] = null_test
+        self._bits         = bits
+        self._layout       = layout or {} # test name : (available bit, incomplete bit)
+        self._tests        = {}           # test name : StatusTest, once built
+
+    def __getattr__(self, name):
+        # only called for names that aren't slots (ie: test names)
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        test = self._tests.get(name)
+        if test is None:
+            if name in self._layout:
+                available, incomplete = self._layout[name]
+                test = StatusTest(name, self._bits[available], not self._bits[incomplete])
+            elif name in STATUS_TESTS:
+                # make sure each standard test is available by name, even
+                # when the vehicle doesn't have it. This prevents things from
+                # breaking when the user looks up a standard test that's null.
+                test = self._tests.get(None) or StatusTest()
+                self._tests[None] = test
+            else:
+                raise AttributeError("'Status' object has no attribute '%s'" % name)
+            self._tests[name] = test
+        return test
+
+    def __copy__(self):
+        # shares the (read-only) bits and layout, but builds its own tests
+        other = Status(self._bits, self._layout)
+        other.MIL           = self.MIL
+        other.DTC_count     = self.DTC_count
+        other.ignition_type = self.ignition_type
+        return other
+
+
+# names of the standard readiness tests
+STATUS_TESTS = frozenset([ name for name in BASE_TESTS + SPARK_TESTS + COMPRESSION_TESTS if name ])
 
 
 class StatusTest():
+    __slots__ = ("name", "available", "complete")
+
     def __init__(self, name="", available=False, complete=False):
         self.name = name
         self.available = available
@@ -101,27 +143,55 @@ class StatusTest():
 
 
 class Monitor():
-    def __init__(self):
-        self._tests = {} # tid : MonitorTest
+    """
+        On-board monitoring test results (mode 06). Results can be added
+        as raw 9 byte blocks, which are only parsed into MonitorTests when
+        they're first looked up.
+    """
 
-        # make the standard TIDs available as null monitor tests
-        # until real data comes it. This also prevents things from
-        # breaking when the user looks up a standard test that's null.
-        null_test = MonitorTest()
+    __slots__ = ("_tests", "_parse", "_null")
 
-        for tid in TEST_IDS:
-            name = TEST_IDS[tid][0]
-            self.__dict__[name] = null_test
-            self._tests[tid] = null_test
+    def __init__(self, parse=None):
+        self._tests = {}     # tid : MonitorTest, or the raw block until parsed
+        self._parse = parse  # function parsing a raw block into a MonitorTest
+        self._null  = None
 
     def add_test(self, test):
+        self._tests.pop(test.tid, None) # the latest result comes last
         self._tests[test.tid] = test
-        if test.name is not None:
-            self.__dict__[test.name] = test
+
+    def add_block(self, tid, block):
+        self._tests.pop(tid, None)
+        self._tests[tid] = block
+
+    def __test(self, tid):
+        test = self._tests.get(tid)
+        if (test is not None) and not isinstance(test, MonitorTest):
+            test = self._parse(test)
+            self._tests[tid] = test
+        return test
+
+    def __copy__(self):
+        # shares the raw blocks (which are never modified), but parses its own tests
+        other = Monitor(self._parse)
+        for tid, test in self._tests.items():
+            other._tests[tid] = copy.copy(test) if isinstance(test, MonitorTest) else test
+        return other
+
+    def __null_test(self):
+        # the standard TIDs read as null monitor tests when they're missing.
+        # This prevents things from breaking when the user looks up a
+        # standard test that's null.
+        if self._null is None:
+            self._null = MonitorTest()
+        return self._null
 
     @property
     def tests(self):
-        return [test for test in self._tests.values() if not test.is_null()]
+        # standard tests in TID order, followed by the others as they arrived
+        tids = sorted(self._tests, key=lambda tid: TEST_ORDER.get(tid, len(TEST_ORDER)))
+        tests = [ self.__test(tid) for tid in tids ]
+        return [ test for test in tests if not test.is_null() ]
 
     def __str__(self):
         if len(self.tests) > 0:
@@ -132,17 +202,37 @@ class Monitor():
     def __len__(self):
         return len(self.tests)
 
+    def __getattr__(self, name):
+        # only called for names that aren't slots (ie: test names)
+        if name in TEST_NAMES:
+            return self.__test(TEST_NAMES[name]) or self.__null_test()
+        elif name == "Unknown":
+            # the latest result with a non-standard TID
+            for tid in reversed(list(self._tests)):
+                if tid not in TEST_IDS:
+                    return self.__test(tid)
+        raise AttributeError("'Monitor' object has no attribute '%s'" % name)
+
     def __getitem__(self, key):
         if isinstance(key, int):
-            return self._tests.get(key, MonitorTest())
+            return self.__test(key) or self.__null_test()
         elif isinstance(key, str) or isinstance(key, unicode):
-            return self.__dict__.get(key, MonitorTest())
+            try:
+                return self.__getattr__(key)
+            except AttributeError:
+                return MonitorTest()
         else:
             logger.warning("Monitor test results can only be retrieved by TID value or property name")
 
 
+# TID lookups for the standard tests
+TEST_NAMES = dict([ (TEST_IDS[tid][0], tid) for tid in TEST_IDS ])
+TEST_ORDER = dict([ (tid, i) for i, tid in enumerate(TEST_IDS) ])
+
 
 class MonitorTest():
+    __slots__ = ("tid", "name", "desc", "value", "min", "max")
+
     def __init__(self):
         self.tid = None
         self.name = None
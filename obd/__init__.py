@@ -37,9 +37,11 @@
 #                                                                      #
 ########################################################################
 
+import sys
+
 from .__version__ import __version__
 from .obd import OBD
-from .async import Async
+from .asynchronous import Async
 from .commands import commands
 from .OBDCommand import OBDCommand
 from .OBDResponse import OBDResponse
@@ -55,3 +57,21 @@ logger.setLevel(logging.WARNING)
 console_handler = logging.StreamHandler() # sends output to stderr
 console_handler.setFormatter(logging.Formatter("[%(name)s] %(message)s"))
 logger.addHandler(console_handler)
+
+
+# asyncio takes longer to import than the rest of python-OBD combined,
+# so the asyncio connection is only imported once it's asked for
+if sys.version_info >= (3, 7):
+    def __getattr__(name):
+        if name == "AsyncIOOBD":
+            try:
+                from .aio import AsyncIOOBD
+                return AsyncIOOBD
+            except (ImportError, SyntaxError):
+                pass # requires asyncio (python 3.6+) on a POSIX platform
+        raise AttributeError("module 'obd' has no attribute '%s'" % name)
+else:
+    try:
+        from .aio import AsyncIOOBD
+    except (ImportError, SyntaxError):
+        pass # requires asyncio (python 3.6+) on a POSIX platform
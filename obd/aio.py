@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+
+########################################################################
+#                                                                      #
+# python-OBD: A python OBD-II serial module derived from pyobd         #
+#                                                                      #
+# Copyright 2004 Donour Sizemore (donour@uchicago.edu)                 #
+# Copyright 2009 Secons Ltd. (www.obdtester.com)                       #
+# Copyright 2009 Peter J. Creath                                       #
+# Copyright 2016 Brendan Whitfield (brendan-w.com)                     #
+#                                                                      #
+########################################################################
+#                                                                      #
+# aio.py                                                               #
+#                                                                      #
+# This file is part of python-OBD (a derivative of pyOBD)              #
+#                                                                      #
+# python-OBD is free software: you can redistribute it and/or modify   #
+# it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation, either version 2 of the License, or    #
+# (at your option) any later version.                                  #
+#                                                                      #
+# python-OBD is distributed in the hope that it will be useful,        #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of       #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the        #
+# GNU General Public License for more details.                         #
+#                                                                      #
+# You should have received a copy of the GNU General Public License    #
+# along with python-OBD.  If not, see <http://www.gnu.org/licenses/>.  #
+#                                                                      #
+########################################################################
+
+import os
+import asyncio
+import termios
+import logging
+from .OBDResponse import OBDResponse
+from .elm327 import LineFramer
+from .obd import OBD
+from .utils import OBDStatus
+
+logger = logging.getLogger(__name__)
+
+
+class ELMTransport(object):
+    """
+        Exchanges commands with an ELM327 over a file descriptor,
+        using the event loop's reader callbacks instead of blocking reads.
+
+        Only one exchange happens at a time. Concurrent callers
+        of send() are queued behind a lock.
+    """
+
+    def __init__(self, fd):
+        self.fd       = fd
+        self.__lock   = None # created on first use, so it binds to the running loop
+        self.__framer = None
+        self.__waiter = None
+
+
+    async def send(self, cmd, timeout=10):
+        """
+            writes the given command, and waits (without blocking the loop)
+            for the ELM's prompt. Returns a list of response lines.
+        """
+
+        if self.__lock is None:
+            self.__lock = asyncio.Lock()
+
+        async with self.__lock:
+            loop = asyncio.get_event_loop()
+
+            termios.tcflush(self.fd, termios.TCIFLUSH) # dump everything in the input buffer
+            self.__framer = LineFramer()
+            self.__waiter = loop.create_future()
+
+            loop.add_reader(self.fd, self.__on_readable)
+            try:
+                self.__write(cmd + b"\r\n")
+                await asyncio.wait_for(self.__waiter, timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Failed to read port")
+                self.__framer.finish()
+            finally:
+                loop.remove_reader(self.fd)
+                self.__waiter = None
+
+            return self.__framer.pop_lines()
+
+
+    def __write(self, data):
+        logger.debug("write: " + repr(data))
+        while data:
+            n = os.write(self.fd, data)
+            data = data[n:]
+
+
+    def __on_readable(self):
+        """ reader callback, fired by the event loop when the port has data """
+
+        try:
+            data = os.read(self.fd, 4096)
+        except OSError as e:
+            if not self.__waiter.done():
+                self.__waiter.set_exception(e)
+            return
+
+        logger.debug("read: " + repr(data))
+
+        if not data:
+            self.__framer.finish() # end of file
+
+        # end on chevron (ELM prompt character)
+        if self.__framer.feed(data) and not self.__waiter.done():
+            self.__waiter.set_result(None)
+
+
+
+class AsyncIOOBD(OBD):
+    """
+        Class representing an OBD-II connection with it's assorted commands/sensors
+        Specialized for asyncio event loops.
+
+        Connecting works exactly like OBD (and blocks), but queries
+        are coroutines, which wait for the car on the event loop.
+    """
+
+    def __init__(self, portstr=None, baudrate=None, protocol=None, fast=True, low_latency=False, profile=None, max_baudrate=None, reset="full", units=True):
+        self.__transport    = None
+        self.__frame_counts = {} # keeps track of the number of return frames for each command
+        super(AsyncIOOBD, self).__init__(portstr, baudrate, protocol, fast, low_latency=low_latency, profile=profile, max_baudrate=max_baudrate, reset=reset, units=units)
+
+
+    def __get_transport(self):
+        """ (re)builds the transport around the interface's serial port """
+        fd = self.interface.fileno()
+        if (self.__transport is None) or (self.__transport.fd != fd):
+            self.__transport = ELMTransport(fd)
+        return self.__transport
+
+
+    async def query(self, cmd, force=False):
+        """
+            Awaitable query(). Sends commands to the car, and
+            protects against sending unsupported commands.
+        """
+
+        if self.status() == OBDStatus.NOT_CONNECTED:
+            logger.warning("Query failed, no connection available")
+            return OBDResponse()
+
+        # if the user forces, skip all checks
+        if not force and not self.test_cmd(cmd):
+            return OBDResponse()
+
+        logger.info("Sending command: %s" % str(cmd))
+        cmd_string = cmd.command
+
+        # if we know the number of frames that this command returns,
+        # only wait for exactly that number (see OBD.__build_command_string)
+        # repeating the previous command with a lone CR isn't used here,
+        # since other coroutines may have written to the port in between
+        if self.fast and cmd.fast and (cmd in self.__frame_counts):
+            cmd_string += str(self.__frame_counts[cmd]).encode()
+
+        lines = await self.__get_transport().send(cmd_string)
+        messages = self.interface.parse(lines)
+
+        if cmd not in self.__frame_counts:
+            self.__frame_counts[cmd] = sum([len(m.frames) for m in messages])
+
+        if not messages:
+            logger.info("No valid OBD Messages returned")
+            return OBDResponse()
+
+        return cmd(messages, self.units) # compute a response object
+
+
+    async def query_many(self, cmds, force=False):
+        """ Awaitable query_many(). Commands are sent one after another """
+        responses = []
+        for c in cmds:
+            responses.append(await self.query(c, force=force))
+        return responses
+
+
+    async def stream(self, cmds, force=False):
+        """
+            Asynchronous generator, which queries the given commands in turn,
+            and yields each new response, for as long as the car is connected.
+
+            async for r in connection.stream([obd.commands.RPM]):
+                ...
+        """
+        while self.is_connected():
+            for c in cmds:
+                yield await self.query(c, force=force)
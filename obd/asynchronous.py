@@ -11,7 +11,7 @@
 #                                                                      #
 ########################################################################
 #                                                                      #
-# async.py                                                             #
+# asynchronous.py                                                      #
 #                                                                      #
 # This file is part of python-OBD (a derivative of pyOBD)              #
 #                                                                      #
@@ -45,13 +45,17 @@ class Async(OBD):
         Specialized for asynchronous value reporting.
     """
 
-    def __init__(self, portstr=None, baudrate=None, protocol=None, fast=True):
-        super(Async, self).__init__(portstr, baudrate, protocol, fast)
+    def __init__(self, portstr=None, baudrate=None, protocol=None, fast=True, tune_timeout=False, low_latency=False, profile=None, max_baudrate=None, reset="full", units=True):
+        # set up the loop's state first, since a failed connection calls close()
         self.__commands    = {} # key = OBDCommand, value = Response
         self.__callbacks   = {} # key = OBDCommand, value = list of Functions
+        self.__periods     = {} # key = OBDCommand, value = target seconds between updates (0 = as fast as possible)
+        self.__deadlines   = {} # key = OBDCommand, value = time by which the next update is due
+        self.__missed      = {} # key = OBDCommand, value = number of missed deadlines
         self.__thread      = None
         self.__running     = False
         self.__was_running = False # used with __enter__() and __exit__()
+        super(Async, self).__init__(portstr, baudrate, protocol, fast, tune_timeout, low_latency, profile, max_baudrate, reset, units)
 
 
     @property
@@ -125,11 +129,12 @@ class Async(OBD):
         super(Async, self).close()
 
 
-    def watch(self, c, callback=None, force=False):
+    def watch(self, c, callback=None, force=False, period=None):
         """
             Subscribes the given command for continuous updating. Once subscribed,
             query() will return that command's latest value. Optional callbacks can
-            be given, which will be fired upon every new value.
+            be given, which will be fired upon every new value. An optional period
+            (in seconds) sets the target time between updates for this command.
         """
 
         # the dict shouldn't be changed while the daemon thread is iterating
@@ -146,6 +151,12 @@ class Async(OBD):
                 logger.info("Watching command: %s" % str(c))
                 self.__commands[c] = OBDResponse() # give it an initial value
                 self.__callbacks[c] = [] # create an empty list
+                self.__periods[c] = 0
+                self.__missed[c] = 0
+
+            if period is not None:
+                logger.info("Setting update period for command: %s to %.3fs" % (str(c), period))
+                self.__periods[c] = max(period, 0)
 
             # if a callback was given, push it
             if hasattr(callback, "__call__") and (callback not in self.__callbacks[c]):
@@ -173,11 +184,19 @@ class Async(OBD):
 
                     # if no more callbacks are left, remove the command entirely
                     if len(self.__callbacks[c]) == 0:
-                        self.__commands.pop(c, None)
+                        self.__forget(c)
                 else:
                     # no callback was specified, pop everything
-                    self.__callbacks.pop(c, None)
-                    self.__commands.pop(c, None)
+                    self.__forget(c)
+
+
+    def __forget(self, c):
+        """ drops all of the state kept for a watched command """
+        self.__commands.pop(c, None)
+        self.__callbacks.pop(c, None)
+        self.__periods.pop(c, None)
+        self.__deadlines.pop(c, None)
+        self.__missed.pop(c, None)
 
 
     def unwatch_all(self):
@@ -190,6 +209,9 @@ class Async(OBD):
             logger.info("Unwatching all")
             self.__commands  = {}
             self.__callbacks = {}
+            self.__periods   = {}
+            self.__deadlines = {}
+            self.__missed    = {}
 
 
     def query(self, c):
@@ -204,6 +226,50 @@ class Async(OBD):
             return OBDResponse()
 
 
+    def missed_deadlines(self):
+        """
+            Returns a dict of { OBDCommand : count } for the number
+            of times each watched command fell a whole period behind schedule.
+        """
+        return dict(self.__missed)
+
+
+    def __next_commands(self, now):
+        """
+            Picks the commands to send during this pass of the update loop.
+
+            Commands that are due are returned earliest-deadline-first.
+            If nothing is due, the spare slot is given to the commands
+            without a period (as fast as possible). Commands with a
+            period are never sent before their deadline.
+        """
+
+        due = [ c for c in self.__commands if self.__deadlines.get(c, 0) <= now ]
+
+        if due:
+            return sorted(due, key=lambda c: self.__deadlines.get(c, 0))
+
+        return [ c for c in self.__commands if self.__periods[c] == 0 ]
+
+
+    def __reschedule(self, c, now):
+        """ moves a command's deadline forward by one period """
+
+        period = self.__periods[c]
+        deadline = self.__deadlines.get(c)
+
+        if deadline is None or period == 0:
+            # first update, or a command that runs as fast as possible
+            self.__deadlines[c] = now + period
+        else:
+            deadline += period
+            if deadline <= now:
+                # fell behind by at least one whole period, don't try to catch up
+                self.__missed[c] += 1
+                deadline = now + period
+            self.__deadlines[c] = deadline
+
+
     def run(self):
         """ Daemon thread """
 
@@ -211,14 +277,25 @@ class Async(OBD):
         while self.__running:
 
             if len(self.__commands) > 0:
-                # loop over the requested commands, send, and collect the response
-                for c in self.__commands:
+                now = time.time()
+                cmds = self.__next_commands(now)
+
+                if not cmds:
+                    # nothing is due, wait for the next deadline
+                    # (in short steps, so that stop() isn't held up)
+                    wait = min(self.__deadlines.values()) - now
+                    time.sleep(min(max(wait, 0), 0.25))
+                    continue
+
+                # send as a batch, since commands are checked for support in watch()
+                # the connection will pack them into shared requests where it can
+                responses = super(Async, self).query_many(cmds, force=True)
 
-                    # force, since commands are checked for support in watch()
-                    r = super(Async, self).query(c, force=True)
+                for c, r in zip(cmds, responses):
 
                     # store the response
                     self.__commands[c] = r
+                    self.__reschedule(c, now)
 
                     # fire the callbacks, if there are any
                     for callback in self.__callbacks[c]:
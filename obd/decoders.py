@@ -31,7 +31,9 @@
 ########################################################################
 
 import math
+import struct
 import functools
+from collections import namedtuple
 from .utils import *
 from .codes import *
 from .OBDResponse import Status, StatusTest, Monitor, MonitorTest
@@ -72,6 +74,94 @@ def raw_string(messages):
     return "\n".join([m.raw() for m in messages])
 
 
+"""
+Decoders for physical values compute a plain number, and are wrapped with
+scaled(), which attaches the unit. Called normally, they return a pint
+Quantity. Their .raw attribute skips the Quantity, for OBD(units=False).
+
+Most of them read one big-endian integer and scale it. Those also carry a
+Linear description of their arithmetic, from which compile_decoder() builds
+a specialised version for a given response size (see OBDCommand.__call__)
+"""
+
+# (((int + pre) * mul) / div) + post, where the int is read from
+# data[2+start : 2+start+length] (length=None reads to the end).
+# None/0 constants are skipped, so ints stay ints where they did before.
+Linear = namedtuple("Linear", "start length signed pre mul div post")
+
+def linear(start=0, length=None, signed=False, pre=0, mul=None, div=None, post=0):
+    return Linear(start, length, signed, pre, mul, div, post)
+
+
+def scaled(unit, layout=None):
+    """ marks a decoder as returning a number in the given (pint) unit """
+    def decorator(raw):
+        @functools.wraps(raw)
+        def decoder(messages):
+            v = raw(messages)
+            if v is None:
+                return None
+            return Unit.Quantity(v, unit)
+        decoder.raw = raw
+        decoder.unit = unit
+        decoder.layout = layout
+        return decoder
+    return decorator
+
+
+# struct codes for the integer sizes that have one
+STRUCT_CODES = {
+    (2, False) : ">H",
+    (2, True)  : ">h",
+    (4, False) : ">I",
+    (4, True)  : ">i",
+}
+
+def compile_decoder(decoder, n_bytes):
+    """
+        Builds a raw decoder, specialised for responses of exactly n_bytes
+        (mode and PID included), with the decoder's constants folded in.
+        Returns None for decoders without a Linear layout, or sizes that
+        can't be compiled. The result matches decoder.raw.
+    """
+
+    layout = getattr(decoder, "layout", None)
+    if layout is None:
+        return None
+
+    start = 2 + layout.start
+    length = (n_bytes - start) if layout.length is None else layout.length
+    if (length < 1) or (start + length > n_bytes):
+        return None
+
+    # read the integer
+    if length == 1:
+        expr = "d[%d]" % start
+        if layout.signed:
+            expr = "(%s ^ 0x80) - 0x80" % expr
+    elif (length, layout.signed) in STRUCT_CODES:
+        expr = "unpack_from(%r, d, %d)[0]" % (STRUCT_CODES[(length, layout.signed)], start)
+    elif not layout.signed:
+        expr = " | ".join([ "(d[%d] << %d)" % (start + i, 8 * (length - 1 - i)) for i in range(length) ])
+    else:
+        return None
+
+    # apply the arithmetic, in the same order as the decoder
+    if layout.pre:
+        expr = "(%s) + %r" % (expr, layout.pre)
+    if layout.mul is not None:
+        expr = "(%s) * %r" % (expr, layout.mul)
+    if layout.div is not None:
+        expr = "(%s) / %r" % (expr, layout.div)
+    if layout.post:
+        expr = "(%s) + %r" % (expr, layout.post)
+
+    source = "def %s(messages):\n    d = messages[0].data\n    return %s\n" % (decoder.__name__, expr)
+    namespace = { "unpack_from" : struct.unpack_from }
+    exec(source, namespace)
+    return namespace[decoder.__name__]
+
+
 """
 Some decoders are simple and are already implemented in the Units And Scaling
 tables (used mainly for Mode 06). The uas() decoder is a wrapper for any
@@ -80,122 +170,137 @@ Unit/Scaling in that table, simply to avoid redundant code.
 
 def uas(id):
     """ get the corresponding decoder for this UAS ID """
-    return functools.partial(decode_uas, id=id)
-
-def decode_uas(messages, id):
-    d = messages[0].data[2:] # chop off mode and PID bytes
-    return UAS_IDS[id](d)
+    conversion = UAS_IDS[id]
+    def decode_uas_raw(messages):
+        return conversion.raw(messages[0].data[2:]) # chop off mode and PID bytes
+    layout = linear(signed=conversion.signed, mul=conversion.scale, post=conversion.offset)
+    return scaled(conversion.unit, layout)(decode_uas_raw)
 
 
 """
 General sensor decoders
-Return pint Quantities
+Return pint Quantities (or plain numbers, through .raw)
 """
 
 # 0 to 100 %
+@scaled("percent", linear(0, 1, mul=100.0, div=255.0))
 def percent(messages):
     d = messages[0].data[2:]
     v = d[0]
     v = v * 100.0 / 255.0
-    return v * Unit.percent
+    return v
 
 # -100 to 100 %
+@scaled("percent", linear(0, 1, pre=-128, mul=100.0, div=128.0))
 def percent_centered(messages):
     d = messages[0].data[2:]
     v = d[0]
     v = (v - 128) * 100.0 / 128.0
-    return v * Unit.percent
+    return v
 
 # -40 to 215 C
+@scaled("celsius", linear(post=-40))
 def temp(messages):
     d = messages[0].data[2:]
     v = bytes_to_int(d)
     v = v - 40
-    return Unit.Quantity(v, Unit.celsius) # non-multiplicative unit
+    return v
 
 # -128 to 128 mA
+@scaled("milliampere", linear(2, 2, div=256.0, post=-128))
 def current_centered(messages):
     d = messages[0].data[2:]
     v = bytes_to_int(d[2:4])
     v = (v / 256.0) - 128
-    return v * Unit.milliampere
+    return v
 
 # 0 to 1.275 volts
+@scaled("volt", linear(0, 1, div=200.0))
 def sensor_voltage(messages):
     d = messages[0].data[2:]
     v = d[0] / 200.0
-    return v * Unit.volt
+    return v
 
 # 0 to 8 volts
+@scaled("volt", linear(2, 2, mul=8.0, div=65535))
 def sensor_voltage_big(messages):
     d = messages[0].data[2:]
     v = bytes_to_int(d[2:4])
     v = (v * 8.0) / 65535
-    return v * Unit.volt
+    return v
 
 # 0 to 765 kPa
+@scaled("kilopascal", linear(0, 1, mul=3))
 def fuel_pressure(messages):
     d = messages[0].data[2:]
     v = d[0]
     v = v * 3
-    return v * Unit.kilopascal
+    return v
 
 # 0 to 255 kPa
+@scaled("kilopascal", linear(0, 1))
 def pressure(messages):
     d = messages[0].data[2:]
     v = d[0]
-    return v * Unit.kilopascal
+    return v
 
 # -8192 to 8192 Pa
+@scaled("pascal")
 def evap_pressure(messages):
     # decode the twos complement
     d = messages[0].data[2:]
     a = twos_comp(d[0], 8)
     b = twos_comp(d[1], 8)
     v = ((a * 256.0) + b) / 4.0
-    return v * Unit.pascal
+    return v
 
 # 0 to 327.675 kPa
+@scaled("kilopascal", linear(div=200.0))
 def abs_evap_pressure(messages):
     d = messages[0].data[2:]
     v = bytes_to_int(d)
     v = v / 200.0
-    return v * Unit.kilopascal
+    return v
 
 # -32767 to 32768 Pa
+@scaled("pascal", linear(post=-32767))
 def evap_pressure_alt(messages):
     d = messages[0].data[2:]
     v = bytes_to_int(d)
     v = v - 32767
-    return v * Unit.pascal
+    return v
 
 # -64 to 63.5 degrees
+@scaled("degree", linear(0, 1, pre=-128, div=2.0))
 def timing_advance(messages):
     d = messages[0].data[2:]
     v = d[0]
     v = (v - 128) / 2.0
-    return v * Unit.degree
+    return v
 
 # -210 to 301 degrees
+@scaled("degree", linear(pre=-26880, div=128.0))
 def inject_timing(messages):
     d = messages[0].data[2:]
     v = bytes_to_int(d)
     v = (v - 26880) / 128.0
-    return v * Unit.degree
+    return v
 
 # 0 to 2550 grams/sec
+@scaled("gps", linear(0, 1, mul=10))
 def max_maf(messages):
     d = messages[0].data[2:]
     v = d[0]
     v = v * 10
-    return v * Unit.gps
+    return v
 
 # 0 to 3212 Liters/hour
+@scaled("liters_per_hour", linear(mul=0.05))
 def fuel_rate(messages):
     d = messages[0].data[2:]
     v = bytes_to_int(d)
     v = v * 0.05
-    return v * Unit.liters_per_hour
+    return v
 
 # special bit encoding for PID 13
 def o2_sensors(messages):
@@ -224,19 +329,21 @@ def o2_sensors_alt(messages):
     )
 
 # 0 to 25700 %
+@scaled("percent", linear(mul=100.0 / 255.0))
 def absolute_load(messages):
     d = messages[0].data[2:]
     v = bytes_to_int(d)
     v *= 100.0 / 255.0
-    return v * Unit.percent
+    return v
 
+@scaled("volt")
 def elm_voltage(messages):
     # doesn't register as a normal OBD response,
     # so access the raw frame data
     v = messages[0].frames[0].raw
 
     try:
-        return float(v) * Unit.volt
+        return float(v)
     except ValueError:
         logger.warning("Failed to parse ELM voltage")
         return None
@@ -264,30 +371,35 @@ def status(messages):
     #  10000011 00000111 11111111 00000000
     #   [# DTC] X        [supprt] [~ready]
 
-    output = Status()
+    output = Status(bits, STATUS_LAYOUTS[int(bits[12])])
     output.MIL = bits[0]
     output.DTC_count = bits.value(1, 8)
     output.ignition_type = IGNITION_TYPE[int(bits[12])]
 
-    # load the 3 base tests that are always present
+    # the tests are only built when they're looked up
+    return output
+
+
+def status_layout(tests):
+    """ (available bit, incomplete bit) of each readiness test, by name """
+    layout = {}
+
+    # the 3 base tests that are always present
     for i, name in enumerate(BASE_TESTS[::-1]):
-        t = StatusTest(name, bits[13 + i], not bits[9 + i])
-        output.__dict__[name] = t
+        layout[name] = (13 + i, 9 + i)
 
     # different tests for different ignition types
-    if bits[12]: # compression
-        for i, name in enumerate(COMPRESSION_TESTS[::-1]): # reverse to correct for bit vs. indexing order
-            t = StatusTest(name, bits[(2 * 8) + i],
-                             not bits[(3 * 8) + i])
-            output.__dict__[name] = t
-
-    else: # spark
-        for i, name in enumerate(SPARK_TESTS[::-1]): # reverse to correct for bit vs. indexing order
-            t = StatusTest(name, bits[(2 * 8) + i],
-                             not bits[(3 * 8) + i])
-            output.__dict__[name] = t
+    for i, name in enumerate(tests[::-1]): # reverse to correct for bit vs. indexing order
+        if name: # filter out None/reserved tests
+            layout[name] = ((2 * 8) + i, (3 * 8) + i)
 
-    return output
+    return layout
+
+# indexed by the ignition type bit
+STATUS_LAYOUTS = (
+    status_layout(SPARK_TESTS),
+    status_layout(COMPRESSION_TESTS),
+)
 
 
 
@@ -298,13 +410,16 @@ def fuel_status(messages):
     status_1 = ""
     status_2 = ""
 
-    if bits[0:8].count(True) == 1:
-        status_1 = FUEL_STATUS[ 7 - bits[0:8].index(True) ]
+    # exactly one bit should be set in each byte
+    v = bits.value(0, 8)
+    if v and not (v & (v - 1)):
+        status_1 = FUEL_STATUS[ v.bit_length() - 1 ]
     else:
         logger.debug("Invalid response for fuel status (multiple/no bits set)")
 
-    if bits[8:16].count(True) == 1:
-        status_2 = FUEL_STATUS[ 7 - bits[8:16].index(True) ]
+    v = bits.value(8, 16)
+    if v and not (v & (v - 1)):
+        status_2 = FUEL_STATUS[ v.bit_length() - 1 ]
     else:
         logger.debug("Invalid response for fuel status (multiple/no bits set)")
 
@@ -319,8 +434,9 @@ def air_status(messages):
     bits = bitarray(d)
 
     status = None
-    if bits.num_set() == 1:
-        status = AIR_STATUS[ 7 - bits[0:8].index(True) ]
+    v = bits.value(0, 8)
+    if (bits.num_set() == 1) and v:
+        status = AIR_STATUS[ v.bit_length() - 1 ]
     else:
         logger.debug("Invalid response for fuel status (multiple/no bits set)")
 
@@ -403,7 +519,7 @@ def dtc(messages):
     return codes
 
 
-def parse_monitor_test(d, mon):
+def parse_monitor_test(d, mon, units=True):
     test = MonitorTest()
 
     tid = d[1]
@@ -423,6 +539,10 @@ def parse_monitor_test(d, mon):
         logger.debug("Encountered unknown Units and Scaling ID")
         return None
 
+    # plain numbers skip the Quantity (0x2E is a boolean either way)
+    if not units:
+        uas = getattr(uas, "raw", uas)
+
     # load the test results
     test.tid = tid
     test.value = uas(d[3:5]) # convert bytes to actual values
@@ -432,12 +552,12 @@ def parse_monitor_test(d, mon):
     return test
 
 
-def monitor(messages):
+def monitor(messages, units=True):
     d = messages[0].data[1:] # only dispose of the mode byte. Leave the MID
                              # even though we never use the MID byte, it may
                              # show up multiple times. Thus, keeping it make
                              # for easier parsing.
-    mon = Monitor()
+    mon = Monitor(MONITOR_PARSERS[bool(units)])
 
     # test that we got the right number of bytes
     extra_bytes = len(d) % 9
@@ -446,11 +566,20 @@ def monitor(messages):
         logger.debug("Encountered monitor message with non-multiple of 9 bytes. Truncating...")
         d = d[:len(d) - extra_bytes]
 
-    # look at data in blocks of 9 bytes (one test result)
+    # look at data in blocks of 9 bytes (one test result).
+    # They're parsed into MonitorTests when they're looked up
     for n in range(0, len(d), 9):
-        # extract the 9 byte block, and parse a new MonitorTest
-        test = parse_monitor_test(d[n:n + 9], mon)
-        if test is not None:
-            mon.add_test(test)
+        if d[n + 2] in UAS_IDS:
+            mon.add_block(d[n + 1], d[n:n + 9])
+        else:
+            # we can't decode the value
+            logger.debug("Encountered unknown Units and Scaling ID")
 
     return mon
+
+MONITOR_PARSERS = {
+    True  : functools.partial(parse_monitor_test, mon=None, units=True),
+    False : functools.partial(parse_monitor_test, mon=None, units=False),
+}
+
+monitor.raw = functools.partial(monitor, units=False)
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+########################################################################
+#                                                                      #
+# python-OBD: A python OBD-II serial module derived from pyobd         #
+#                                                                      #
+# Copyright 2004 Donour Sizemore (donour@uchicago.edu)                 #
+# Copyright 2009 Secons Ltd. (www.obdtester.com)                       #
+# Copyright 2009 Peter J. Creath                                       #
+# Copyright 2016 Brendan Whitfield (brendan-w.com)                     #
+#                                                                      #
+########################################################################
+#                                                                      #
+# dtc.py                                                               #
+#                                                                      #
+# This file is part of python-OBD (a derivative of pyOBD)              #
+#                                                                      #
+# python-OBD is free software: you can redistribute it and/or modify   #
+# it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation, either version 2 of the License, or    #
+# (at your option) any later version.                                  #
+#                                                                      #
+# python-OBD is distributed in the hope that it will be useful,        #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of       #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the        #
+# GNU General Public License for more details.                         #
+#                                                                      #
+# You should have received a copy of the GNU General Public License    #
+# along with python-OBD.  If not, see <http://www.gnu.org/licenses/>.  #
+#                                                                      #
+########################################################################
+
+import io
+import os
+import logging
+from array import array
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping # python 2
+
+from .utils import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+GENERIC = os.path.join(DATA_DIR, "dtc.tsv")
+
+
+class DTCTable():
+    """
+        A file of "CODE<tab>description" lines, read on the first lookup.
+        The lines are kept sorted in a single string, and found with a
+        binary search over the offset of each line.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.__text = None
+        self.__starts = None # offset of each line, plus the end of the text
+
+    def loaded(self):
+        return self.__text is not None
+
+    def __load(self):
+        with io.open(self.path, encoding="utf-8") as f:
+            lines = f.read().split("\n")
+
+        entries = []
+        for line in lines:
+            line = line.rstrip("\r")
+            if not line or line.startswith("#"):
+                continue
+            if "\t" not in line:
+                logger.warning("Ignoring malformed line in %s: %r" % (self.path, line))
+                continue
+            entries.append(line)
+
+        # packs may be in any order (data/dtc.tsv is already sorted)
+        code = lambda line: line[:line.index("\t")]
+        if any(code(a) > code(b) for a, b in zip(entries, entries[1:])):
+            entries.sort(key=code)
+
+        starts = array("L")
+        position = 0
+        for line in entries:
+            starts.append(position)
+            position += len(line) + 1
+        starts.append(position)
+
+        self.__text = "\n".join(entries) + "\n"
+        self.__starts = starts
+        logger.debug("Loaded %d DTC descriptions from %s" % (len(entries), self.path))
+
+    def __code(self, i):
+        start = self.__starts[i]
+        return self.__text[start : self.__text.index("\t", start)]
+
+    def get(self, code, default=None):
+        if self.__text is None:
+            self.__load()
+
+        # find the first line whose code is >= the one requested
+        lo = 0
+        hi = len(self.__starts) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.__code(mid) < code:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        if lo < len(self.__starts) - 1 and self.__code(lo) == code:
+            start = self.__starts[lo] + len(code) + 1
+            return self.__text[start : self.__starts[lo + 1] - 1]
+        return default
+
+    def codes(self):
+        if self.__text is None:
+            self.__load()
+        return [ self.__code(i) for i in range(len(self.__starts) - 1) ]
+
+
+class DTCDatabase(Mapping):
+    """
+        Read-only dict of DTC descriptions, keyed by code ("P0104").
+
+        The generic descriptions are read from data/dtc.tsv on the first
+        lookup, and manufacturer-specific packs can be added with
+        add_pack(). Recent lookups are kept in an LRU cache.
+    """
+
+    def __init__(self, path=GENERIC, cache_size=512):
+        self.__tables = [ DTCTable(path) ]
+        self.cache = LRUCache(cache_size)
+
+    def add_pack(self, pack):
+        """
+            Adds manufacturer-specific descriptions, from a file in the
+            same format as data/dtc.tsv. "pack" is either a path, or the
+            name of a pack shipped in data/ (as dtc_<name>.tsv). Packs are
+            read on the next lookup, and take precedence over the generic
+            descriptions, and over packs added before them.
+        """
+        path = pack
+        if not os.path.isfile(path):
+            path = os.path.join(DATA_DIR, "dtc_%s.tsv" % pack)
+            if not os.path.isfile(path):
+                raise ValueError("No DTC pack named '%s'" % pack)
+
+        self.__tables.insert(0, DTCTable(path))
+        self.cache.clear()
+
+    def get(self, code, default=None):
+        found = self.cache.get(code, _MISSING)
+        if found is _MISSING:
+            found = None
+            for table in self.__tables:
+                found = table.get(code)
+                if found is not None:
+                    break
+            self.cache.put(code, found)
+        return default if found is None else found
+
+    def __getitem__(self, code):
+        found = self.get(code)
+        if found is None:
+            raise KeyError(code)
+        return found
+
+    def __contains__(self, code):
+        return self.get(code) is not None
+
+    def __iter__(self):
+        codes = set()
+        for table in self.__tables:
+            codes.update(table.codes())
+        return iter(sorted(codes))
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+
+_MISSING = object()
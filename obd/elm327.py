@@ -30,16 +30,181 @@
 #                                                                      #
 ########################################################################
 
-import re
-import serial
+import os
+import sys
+import errno
+import select
 import time
 import logging
 from .protocols import *
+from .protocols.protocol_can import CANProtocol
 from .utils import OBDStatus
 
 logger = logging.getLogger(__name__)
 
 
+class TimeoutTuner:
+    """
+        Learns how long the car takes to answer, and picks
+        a matching value for the ELM's response timeout (ATST).
+
+        The ELM waits up to ATST for the first response, and again
+        after each response, to see if more are coming. Each sample
+        is therefore the longest of those waits during one exchange.
+    """
+
+    MS_PER_UNIT = 4.096 # ATST is set in units of 4.096 ms
+    DEFAULT     = 0x32  # the ELM's power-on value (~200 ms)
+    MINIMUM     = 0x08  # never go below ~33 ms, even for very quick ECUs
+    MAXIMUM     = 0xFF
+    MARGIN      = 1.5   # headroom over the slowest recent sample
+    SAMPLES     = 16    # number of recent samples to base decisions on
+
+    def __init__(self):
+        self.timeout       = self.DEFAULT
+        self.history       = [] # list of (timestamp, ATST value) for each value pushed
+        self.__samples     = [] # recent latencies (seconds), across all commands
+        self.__commands    = {} # key = command string, value = [ max latency, sum of round trips, count ]
+        self.__ecus        = {} # key = tx_id, value = max latency
+        self.__hold        = self.SAMPLES # samples to wait before tightening again
+
+    def record(self, cmd, latency, round_trip, tx_ids):
+        """ stores the timings for one successful exchange """
+
+        self.__samples = (self.__samples + [latency])[-self.SAMPLES:]
+
+        stats = self.__commands.setdefault(cmd, [0.0, 0.0, 0])
+        stats[0] = max(stats[0], latency)
+        stats[1] += round_trip
+        stats[2] += 1
+
+        for tx_id in tx_ids:
+            self.__ecus[tx_id] = max(self.__ecus.get(tx_id, 0.0), latency)
+
+        if self.__hold > 0:
+            self.__hold -= 1
+
+    def backoff(self, cmd):
+        """
+            called after a NO DATA, doubles the timeout and holds it for a while.
+            Commands that have never answered are most likely unsupported
+            (rather than slow), so they leave the timeout alone.
+        """
+        if cmd not in self.__commands:
+            return self.timeout
+
+        self.__hold = self.SAMPLES
+        self.__samples = []
+        return min(self.timeout * 2, self.MAXIMUM)
+
+    def tighten(self):
+        """ returns a smaller timeout, once enough samples show that it's safe """
+        if self.__hold > 0 or len(self.__samples) < self.SAMPLES:
+            return self.timeout
+
+        ms = max(self.__samples) * 1000.0 * self.MARGIN
+        value = int(ms / self.MS_PER_UNIT) + 1
+        value = max(self.MINIMUM, min(value, self.MAXIMUM))
+        return min(value, self.timeout)
+
+    def chose(self, value):
+        """ records that a new timeout was pushed to the ELM """
+        self.timeout = value
+        self.history.append((time.time(), value))
+
+    def stats(self):
+        """ exports the chosen values and observed timings """
+        return {
+            "timeout"    : self.timeout,
+            "timeout_ms" : self.timeout * self.MS_PER_UNIT,
+            "history"    : list(self.history),
+            "ecus"       : dict([ (k, v * 1000.0) for k, v in self.__ecus.items() ]),
+            "commands"   : dict([ (k, {
+                                "latency_ms"    : v[0] * 1000.0,
+                                "round_trip_ms" : v[1] * 1000.0 / v[2],
+                                "count"         : v[2],
+                            }) for k, v in self.__commands.items() ]),
+        }
+
+
+class LineFramer:
+    """
+        Splits the ELM's output into lines as the bytes arrive.
+
+        Only the newly received bytes are scanned for the prompt
+        character and line breaks, so long multi-frame responses
+        aren't rescanned after every read. Completed lines are
+        handed out by pop_lines(), which can be called at any time.
+    """
+
+    def __init__(self):
+        self.times     = [] # arrival time of each line returned by pop_lines()
+        self.done      = False
+        self.__buffer  = bytearray() # bytes that haven't been split into lines yet
+        self.__breaks  = [] # arrival time of each line break in the buffer
+
+    def feed(self, data):
+        """ accepts newly read bytes, returns True once the prompt was seen """
+
+        if self.done:
+            return True
+
+        # anything after the prompt is ignored
+        end = data.find(ELM327.ELM_PROMPT)
+        if end >= 0:
+            data = data[:end]
+            self.done = True
+
+        self.__buffer += data
+
+        n = data.count(b"\r")
+        if n:
+            self.__breaks += [time.time()] * n
+
+        return self.done
+
+    def finish(self):
+        """ ends the response, even though the prompt wasn't seen """
+        self.done = True
+
+    def pop_lines(self):
+        """
+            returns the lines completed since the last call,
+            dropping empty lines and trailing spaces
+        """
+
+        if self.done:
+            end = len(self.__buffer) # includes the last line, which the prompt ended
+        else:
+            end = self.__buffer.rfind(b"\r") + 1
+
+        if end == 0:
+            return []
+
+        data = self.__buffer[:end]
+        del self.__buffer[:end]
+
+        # clean out any null characters
+        if b"\x00" in data:
+            data = data.replace(b"\x00", b"")
+
+        # linefeeds (if the ELM sends them) are stripped along with the spaces
+        pieces = data.decode().split("\r")
+
+        n = len(pieces) - 1
+        times = self.__breaks[:n] + [time.time()]
+        del self.__breaks[:n]
+
+        lines = []
+        for piece, t in zip(pieces, times):
+            piece = piece.strip()
+            if piece:
+                lines.append(piece)
+                self.times.append(t)
+
+        return lines
+
+
 class ELM327:
     """
         Handles communication with the ELM327 adapter.
@@ -53,10 +218,19 @@ class ELM327:
             port_name()
             protocol_name()
             ecus()
+            baudrate()
+            boot_baudrate()
+            fingerprint()
+            timeout_stats()
+            startup_stats()
+            fileno()
+            parse()
     """
 
     ELM_PROMPT = b'>'
 
+    READ_SIZE = 4096 # most bytes pulled from the port at once
+
     _SUPPORTED_PROTOCOLS = {
         #"0" : None, # Automatic Mode. This isn't an actual protocol. If the
                      # ELM reports this, then we don't have enough
@@ -101,9 +275,27 @@ class ELM327:
     # going to be less picky about the time required to detect it.
     _TRY_BAUDS = [ 38400, 9600, 230400, 115200, 57600, 19200 ]
 
+    # faster bauds to request with AT BRD (see upshift_baudrate()),
+    # fastest first. The ELM's rate is 4 Mbps divided by an integer,
+    # so these are approximate; each switch is confirmed before it's kept.
+    _UPSHIFT_BAUDS = [ 500000, 230400, 115200 ]
+
+    BRD_CLOCK = 4000000 # AT BRD hh sets the baud to BRD_CLOCK / hh
+    BRD_TIMEOUT = 0.5 # seconds to wait for each step of the AT BRD handshake
 
+    # commands for each of the reset options (see __init__())
+    # a warm start (ATWS) skips the LED test, and is quicker
+    _RESET_COMMANDS = {
+        "full" : b"ATZ",
+        "warm" : b"ATWS",
+        "none" : None,
+    }
 
-    def __init__(self, portname, baudrate, protocol):
+    RESET_TIMEOUT = 3 # seconds of silence before giving up on the reset prompt
+
+
+
+    def __init__(self, portname, baudrate, protocol, tune_timeout=False, low_latency=False, max_baudrate=None, reset="full"):
         """Initializes port by resetting device and gettings supported PIDs. """
 
         logger.info("Initializing ELM327: PORT=%s BAUD=%s PROTOCOL=%s" %
@@ -115,10 +307,28 @@ class ELM327:
 
         self.__status   = OBDStatus.NOT_CONNECTED
         self.__port     = None
+        self.__fd       = None # set when the port can be read with select() (see __read_chunk())
         self.__protocol = UnknownProtocol([])
+        self.__tuner    = None
+        self.__last_cmd = b"" # the last command sent through send_and_parse()
+        self.__repeat_ok = False # whether a lone CR will repeat __last_cmd
+        self.__line_times = [] # arrival time of each line returned by the last __read()
+        self.__boot_baudrate = None # the baud that the ELM answered at, before any upshift
+        self.__spaced   = True # whether the ELM puts spaces between bytes
+        self.__startup  = {} # seconds taken by each step of connecting (see startup_stats())
+        self.__target   = None # tx_id that requests are addressed to, None for functional (see set_target())
+        self.__targeting = True # cleared if the adapter rejects ATSH/ATCRA
+
+        if reset not in self._RESET_COMMANDS:
+            logger.error("%s is not a valid reset. Please use \"full\", \"warm\" or \"none\"" % reset)
+            reset = "full"
+
+        start = time.time()
 
 
         # ------------- open port -------------
+        import serial # only loaded when ports are used
+
         try:
             self.__port = serial.Serial(portname, \
                                         parity   = serial.PARITY_NONE, \
@@ -132,19 +342,32 @@ class ELM327:
             self.__error(e)
             return
 
+        # on Linux, wait for data with select() and read it in whole chunks
+        if sys.platform.startswith('linux'):
+            self.__fd = self.__port.fileno()
+
+        # ask the USB-serial driver to pass data on immediately,
+        # rather than batching it (FTDI adapters wait up to 16 ms)
+        if low_latency:
+            self.set_low_latency()
+
         # ------------------------ find the ELM's baud ------------------------
 
         if not self.set_baudrate(baudrate):
             self.__error("Failed to set baudrate")
             return
 
-        # ---------------------------- ATZ (reset) ----------------------------
-        try:
-            self.__send(b"ATZ", delay=1) # wait 1 second for ELM to initialize
-            # return data can be junk, so don't bother checking
-        except serial.SerialException as e:
-            self.__error(e)
-            return
+        self.__boot_baudrate = self.__port.baudrate
+
+        # ---------------------- ATZ / ATWS (reset) -----------------------
+        if self._RESET_COMMANDS[reset] is not None:
+            try:
+                self.__reset(self._RESET_COMMANDS[reset])
+            except serial.SerialException as e:
+                self.__error(e)
+                return
+
+        self.__startup["reset"] = time.time() - start
 
         # -------------------------- ATE0 (echo OFF) --------------------------
         r = self.__send(b"ATE0")
@@ -152,6 +375,9 @@ class ELM327:
             self.__error("ATE0 did not return 'OK'")
             return
 
+        self.__startup["first_response"] = time.time() - start
+        logger.info("First response from the ELM after %.3f seconds" % self.__startup["first_response"])
+
         # ------------------------- ATH1 (headers ON) -------------------------
         r = self.__send(b"ATH1")
         if not self.__isok(r):
@@ -164,12 +390,27 @@ class ELM327:
             self.__error("ATL0 did not return 'OK'")
             return
 
+        # ------------------------- ATS0 (spaces OFF) -------------------------
+        # saves a third of the bytes in each response. Not every clone
+        # supports it, so leave the spaces for the protocol parsers if not.
+        r = self.__send(b"ATS0")
+        if self.__isok(r):
+            self.__spaced = False
+        else:
+            logger.info("ATS0 did not return 'OK', leaving spaces on")
+
+        # ------------- AT BRD (switch to a faster baud, if asked) -------------
+        if max_baudrate is not None:
+            self.upshift_baudrate(max_baudrate)
+
         # by now, we've successfuly communicated with the ELM, but not the car
         self.__status = OBDStatus.ELM_CONNECTED
 
         # try to communicate with the car, and load the correct protocol parser
         if self.set_protocol(protocol):
             self.__status = OBDStatus.CAR_CONNECTED
+            self.__protocol.spaced = self.__spaced
+            self.__startup["car"] = time.time() - start
             logger.info("Connected Successfully: PORT=%s BAUD=%s PROTOCOL=%s" %
                         (
                             portname,
@@ -178,6 +419,15 @@ class ELM327:
                         ))
         else:
             logger.error("Connected to the adapter, but failed to connect to the vehicle")
+            return
+
+        # ------------- ATAT1 (adaptive timing ON, ATST is the ceiling) -------------
+        if tune_timeout:
+            r = self.__send(b"ATAT1")
+            if self.__isok(r):
+                self.__tuner = TimeoutTuner()
+            else:
+                logger.warning("ATAT1 did not return 'OK', timeout tuning disabled")
 
 
     def set_protocol(self, protocol):
@@ -255,6 +505,20 @@ class ELM327:
         return False
 
 
+    def set_low_latency(self):
+        """
+            Sets the ASYNC_LOW_LATENCY flag on the serial driver (Linux only).
+            Returns boolean for success.
+        """
+        try:
+            self.__port.set_low_latency_mode(True)
+            logger.debug("Enabled low latency mode")
+            return True
+        except (AttributeError, IOError, ValueError, NotImplementedError) as e:
+            logger.warning("Failed to enable low latency mode: %s" % str(e))
+            return False
+
+
     def set_baudrate(self, baud):
         if baud is None:
             # when connecting to pseudo terminal, don't bother with auto baud
@@ -278,31 +542,155 @@ class ELM327:
         timeout = self.__port.timeout
         self.__port.timeout = 0.1 # we're only talking with the ELM, so things should go quickly
 
-        for baud in self._TRY_BAUDS:
-            self.__port.baudrate = baud
-            self.__port.flushInput()
-            self.__port.flushOutput()
+        baud = self.detect_baudrate(self.__port, self._TRY_BAUDS)
+
+        self.__port.timeout = timeout # reinstate our original timeout
+        return baud is not None
+
+
+    def upshift_baudrate(self, max_baudrate):
+        """
+        Asks the ELM to switch to a faster baud (AT BRD), trying each of
+        _UPSHIFT_BAUDS up to max_baudrate, fastest first. A failed switch
+        is rolled back. Returns the new baud, or None if it didn't change.
+        """
+
+        old = self.__port.baudrate
+
+        # the ELM confirms a switch by sending its ID string at the new rate
+        r = self.__send(b"ATI")
+        if len(r) != 1:
+            logger.warning("ATI did not return the ELM's ID, not changing baudrate")
+            return None
+
+        for baud in self._UPSHIFT_BAUDS:
+            if (baud <= old) or (baud > max_baudrate):
+                continue
+
+            result = self.__switch_baudrate(baud, r[0])
+
+            if result is None:
+                logger.info("ELM does not support AT BRD, staying at %d baud" % old)
+                break
+            elif result:
+                logger.info("Switched baudrate from %d to %d" % (old, baud))
+                return baud
+
+        logger.info("Baudrate remains %d" % self.__port.baudrate)
+        return None
+
+
+    def __switch_baudrate(self, baud, ident):
+        """
+        Runs the AT BRD handshake for a single baud:
+
+            --> ATBRD hh        (old baud)
+            <-- OK              (old baud)
+            <-- ELM327 v1.5     (new baud)
+            --> CR              (new baud, within the ELM's ATBRT timeout)
+            <-- OK >            (new baud)
+
+        If the ELM doesn't get the CR, it returns to the old baud.
+        Returns True on success, False if the old baud was restored,
+        or None if the ELM rejected the command.
+        """
+
+        old = self.__port.baudrate
+        divisor = int(round(float(self.BRD_CLOCK) / baud))
+
+        self.__write(b"ATBRD" + ("%02X" % divisor).encode())
+        r = self.__read_raw(b"\r")
+        if b"OK" not in r:
+            self.__read_raw(self.ELM_PROMPT) # drop the rest of the error
+            return None
+
+        self.__port.baudrate = baud
+
+        # the start of the ID may have arrived along with the OK
+        r = r.split(b"OK", 1)[1].lstrip(b"\r")
+        if b"\r" not in r:
+            r += self.__read_raw(b"\r")
+        if ident.encode() in r:
+            self.__port.write(b"\r")
+            r = self.__read_raw(self.ELM_PROMPT)
+            if b"OK" in r:
+                return True
+
+        # roll back, and make sure that the ELM did the same
+        logger.debug("AT BRD to %d failed: %s" % (baud, repr(r)))
+        self.__port.baudrate = old
+        self.__read_raw(self.ELM_PROMPT)
+
+        timeout = self.__port.timeout
+        self.__port.timeout = 0.1
+        found = self.detect_baudrate(self.__port, [old, baud])
+        self.__port.timeout = timeout
+
+        if found is None:
+            logger.error("Lost contact with the ELM while changing baudrate")
+        return found == baud
+
+
+    @classmethod
+    def detect_baudrate(cls, port, bauds):
+        """
+        Tries each of the given bauds on an open serial port, until
+        the ELM answers with a prompt. Returns the baud, or None.
+        """
+
+        for baud in bauds:
+            port.baudrate = baud
+            port.flushInput()
+            port.flushOutput()
 
             # Send a nonsense command to get a prompt back from the scanner
             # (an empty command runs the risk of repeating a dangerous command)
             # The first character might get eaten if the interface was busy,
             # so write a second one (again so that the lone CR doesn't repeat
             # the previous command)
-            self.__port.write(b"\x7F\x7F\r\n")
-            self.__port.flush()
-            response = self.__port.read(1024)
+            port.write(b"\x7F\x7F\r\n")
+            port.flush()
+            response = port.read(1024)
             logger.debug("Response from baud %d: %s" % (baud, repr(response)))
 
             # watch for the prompt character
             if response.endswith(b">"):
                 logger.debug("Choosing baud %d" % baud)
-                self.__port.timeout = timeout # reinstate our original timeout
-                return True
+                return baud
 
 
         logger.debug("Failed to choose baud")
-        self.__port.timeout = timeout # reinstate our original timeout
-        return False
+        return None
+
+
+    @classmethod
+    def probe(cls, portname, baudrate=None):
+        """
+        Opens the given port, and checks whether an ELM answers at the given
+        baudrate (or any of _TRY_BAUDS). The port is closed again afterwards.
+        Returns the baud that the ELM answered at, or None.
+        """
+
+        import serial
+
+        try:
+            port = serial.Serial(portname, \
+                                 parity   = serial.PARITY_NONE, \
+                                 stopbits = 1, \
+                                 bytesize = 8,
+                                 timeout = 0.1) # seconds
+        except (serial.SerialException, OSError) as e:
+            logger.debug("Failed to open %s: %s" % (portname, str(e)))
+            return None
+
+        try:
+            bauds = cls._TRY_BAUDS if baudrate is None else [baudrate]
+            return cls.detect_baudrate(port, bauds)
+        except (serial.SerialException, OSError) as e:
+            logger.debug("Failed to probe %s: %s" % (portname, str(e)))
+            return None
+        finally:
+            port.close()
 
 
 
@@ -318,8 +706,10 @@ class ELM327:
 
 
     def __has_message(self, lines, text):
+        # ignore spaces, in case the ELM removes them from its messages (ATS0)
+        text = text.replace(' ', '')
         for line in lines:
-            if text in line:
+            if text in line.replace(' ', ''):
                 return True
         return False
 
@@ -345,6 +735,35 @@ class ELM327:
         return self.__protocol.ecu_map.values()
 
 
+    def baudrate(self):
+        if self.__port is not None:
+            return self.__port.baudrate
+        else:
+            return None
+
+
+    def boot_baudrate(self):
+        """ returns the baud that the ELM answered at, before any upshift """
+        return self.__boot_baudrate
+
+
+    def fingerprint(self):
+        """
+            returns the ECU map, along with each ECU's answer to
+            the 0100 sent while connecting. Used to check whether
+            a saved connection profile still fits the car.
+
+            { "2024" : { "ecu" : ECU.ENGINE, "0100" : "4100be3eb811" } }
+        """
+        ecus = {}
+        for tx_id, data in self.__protocol.response_0100.items():
+            ecus[str(tx_id)] = {
+                "ecu"  : self.__protocol.ecu_map.get(tx_id, ECU.UNKNOWN),
+                "0100" : data.decode(),
+            }
+        return ecus
+
+
     def protocol_name(self):
         return self.__protocol.ELM_NAME
 
@@ -353,6 +772,90 @@ class ELM327:
         return self.__protocol.ELM_ID
 
 
+    def fileno(self):
+        """
+            returns the file descriptor of the serial port,
+            so that event loops can watch it (see aio.py)
+        """
+        if self.__port is None:
+            return None
+        return self.__port.fileno()
+
+
+    def parse(self, lines):
+        """
+            parses a list of response lines (see split_lines())
+            with the current protocol. Returns a list of Messages
+        """
+        return self.__protocol(lines)
+
+
+    def timeout_stats(self):
+        """
+            returns the response timeouts chosen by the tuner,
+            along with the timings they were based on
+        """
+        if self.__tuner is None:
+            return {}
+        return self.__tuner.stats()
+
+
+    def startup_stats(self):
+        """
+            returns the seconds from opening the port until the
+            reset finished, the ELM's first response, and the car's
+        """
+        return dict(self.__startup)
+
+
+    def __reset(self, cmd):
+        """
+            resets the ELM, and waits for its banner and prompt.
+            Returns as soon as the prompt arrives, rather than sleeping
+            for the longest that a reset could take.
+        """
+        timeout = self.__port.timeout
+        self.__port.timeout = self.RESET_TIMEOUT
+        try:
+            self.__send(cmd)
+            # return data can be junk, so don't bother checking
+        finally:
+            self.__port.timeout = timeout
+
+
+    def __set_timeout(self, value):
+        """ pushes a new response timeout (ATST) to the ELM """
+        r = self.__send(b"ATST" + ("%02X" % value).encode())
+        if self.__isok(r):
+            logger.info("Set response timeout to %.1f ms" % (value * TimeoutTuner.MS_PER_UNIT))
+            self.__tuner.chose(value)
+        else:
+            logger.warning("ATST did not return 'OK'")
+
+
+    def __tune_timeout(self, cmd, lines, messages, start):
+        """ feeds the timings of the last exchange to the tuner """
+
+        if self.__has_message(lines, "NO DATA"):
+            value = self.__tuner.backoff(cmd)
+        else:
+            if not messages or not self.__line_times:
+                return
+
+            # the longest the ELM had to wait: either for the first line,
+            # or between any two lines
+            times = [start] + self.__line_times
+            latency = max([ b - a for a, b in zip(times, times[1:]) ])
+            round_trip = time.time() - start
+
+            tx_ids = [ m.tx_id for m in messages if m.tx_id is not None ]
+            self.__tuner.record(cmd, latency, round_trip, tx_ids)
+            value = self.__tuner.tighten()
+
+        if value != self.__tuner.timeout:
+            self.__set_timeout(value)
+
+
     def close(self):
         """
             Resets the device, and sets all
@@ -385,11 +888,132 @@ class ELM327:
             logger.info("cannot send_and_parse() when unconnected")
             return None
 
+        if cmd:
+            self.__last_cmd = cmd
+        elif not self.__repeat_ok:
+            # the ELM would repeat one of our own AT commands,
+            # so send the previous command in full instead
+            cmd = self.__last_cmd
+
+        start = time.time()
         lines = self.__send(cmd)
         messages = self.__protocol(lines)
+        self.__repeat_ok = True
+
+        if self.__tuner is not None:
+            self.__tune_timeout(self.__last_cmd, lines, messages, start)
+
         return messages
 
 
+    def set_target(self, ecu):
+        """
+            CAN only: addresses the following requests to a single ECU
+            (ATSH), and only accepts its replies (ATCRA), so that other
+            ECUs stay quiet. ECU.ALL, or any ECU that isn't mapped to
+            exactly one tx_id, returns to functional (broadcast) requests.
+
+            Nothing is sent unless the target changes.
+        """
+
+        if not self.__targeting or self.__status == OBDStatus.NOT_CONNECTED:
+            return
+
+        # J1939 doesn't use the OBD request/response IDs
+        if not isinstance(self.__protocol, CANProtocol) or self.__protocol.ELM_ID == "A":
+            return
+
+        tx_ids = [ tx_id for tx_id, e in self.__protocol.ecu_map.items() if e == ecu ]
+        tx_id = tx_ids[0] if len(tx_ids) == 1 else None
+
+        # 11-bit physical IDs only cover 7E0 - 7E7
+        if (self.__protocol.id_bits == 11) and (tx_id is not None) and (tx_id > 7):
+            tx_id = None
+
+        if tx_id == self.__target:
+            return
+
+        functional = b"7DF" if self.__protocol.id_bits == 11 else b"DB33F1"
+
+        if tx_id is None:
+            # functional requests, default receive filter
+            header = functional
+            receive = b""
+        elif self.__protocol.id_bits == 11:
+            # ex: request on 7E0, reply on 7E8
+            header = ("7E%X" % tx_id).encode()
+            receive = ("7E%X" % (tx_id + 8)).encode()
+        else:
+            # ex: request on 18 DA 10 F1, reply on 18 DA F1 10
+            header = ("DA%02XF1" % tx_id).encode()
+            receive = ("18DAF1%02X" % tx_id).encode()
+
+        if self.__isok(self.__send(b"ATSH" + header)) and \
+           self.__isok(self.__send(b"ATCRA" + receive)):
+            self.__target = tx_id
+            logger.debug("addressing requests to %s" % ("all ECUs" if tx_id is None else "tx_id %d" % tx_id))
+        else:
+            logger.warning("Adapter rejected ATSH/ATCRA, sending functional requests")
+            self.__targeting = False
+            self.__send(b"ATSH" + functional)
+            self.__send(b"ATCRA")
+            self.__target = None
+
+
+    def target(self):
+        """
+            returns the tx_id that requests are currently addressed to,
+            or None for functional requests (see set_target())
+        """
+        return self.__target
+
+
+    def monitor(self, pgn=None):
+        """
+            Puts the adapter into monitor mode, and yields each line as
+            it arrives. Monitors a single J1939 PGN (AT MP) when one is
+            given, or every message on the bus (AT MA) otherwise.
+
+            Closing the generator stops the monitor.
+        """
+
+        if self.__status == OBDStatus.NOT_CONNECTED:
+            logger.info("cannot monitor() when unconnected")
+            return
+
+        # a receive filter would also hide the bus traffic
+        self.set_target(ECU.ALL)
+
+        if self.__protocol.ELM_ID == "A":
+            # print plain 29-bit IDs, rather than splitting out the PGN
+            if not self.__isok(self.__send(b"ATJHF0")):
+                logger.warning("Adapter didn't accept ATJHF0, J1939 headers may be misread")
+
+        if pgn is None:
+            cmd = b"ATMA"
+        elif pgn <= 0xFFFF:
+            cmd = ("ATMP%04X" % pgn).encode()
+        else:
+            cmd = ("ATMP%06X" % pgn).encode()
+
+        self.__write(cmd)
+        framer = LineFramer()
+
+        try:
+            # runs until the adapter stops by itself (ie: BUFFER FULL),
+            # a quiet bus simply leaves the port timing out
+            while not framer.done:
+                framer.feed(self.__read_chunk())
+                for line in framer.pop_lines():
+                    yield line
+        finally:
+            if not framer.done and self.__port is not None:
+                # any character stops the monitor, then the prompt follows
+                self.__port.write(b"\r")
+                self.__port.flush()
+                self.__read()
+
+
     def __send(self, cmd, delay=None):
         """
             unprotected send() function
@@ -413,6 +1037,8 @@ class ELM327:
             "low-level" function to write a string to the port
         """
 
+        self.__repeat_ok = False
+
         if self.__port:
             cmd += b"\r\n" # terminate
             logger.debug("write: " + repr(cmd))
@@ -434,37 +1060,95 @@ class ELM327:
             logger.info("cannot perform __read() when unconnected")
             return []
 
-        buffer = bytearray()
+        framer = LineFramer()
+        debug = logger.isEnabledFor(logging.DEBUG)
+        chunks = [] # raw data, only kept for logging
 
         while True:
             # retrieve as much data as possible
-            data = self.__port.read(self.__port.in_waiting or 1)
+            data = self.__read_chunk()
 
             # if nothing was recieved
             if not data:
                 logger.warning("Failed to read port")
+                framer.finish()
                 break
 
-            buffer.extend(data)
+            if debug:
+                chunks.append(data)
 
             # end on chevron (ELM prompt character)
-            if self.ELM_PROMPT in buffer:
+            if framer.feed(data):
                 break
 
-        # log, and remove the "bytearray(   ...   )" part
-        logger.debug("read: " + repr(buffer)[10:-1])
+        if debug:
+            logger.debug("read: " + repr(b"".join(chunks)))
 
-        # clean out any null characters
-        buffer = re.sub(b"\x00", b"", buffer)
+        lines = framer.pop_lines()
 
-        # remove the prompt character
-        if buffer.endswith(self.ELM_PROMPT):
-            buffer = buffer[:-1]
+        # note when each line arrived (used for timeout tuning)
+        self.__line_times = framer.times
 
-        # convert bytes into a standard string
-        string = buffer.decode()
+        return lines
 
-        # splits into lines while removing empty lines and trailing spaces
-        lines = [ s.strip() for s in re.split("[\r\n]", string) if bool(s) ]
 
-        return lines
+    def __read_raw(self, terminator):
+        """
+            reads until the given bytes arrive, without waiting for a
+            prompt. Gives up after BRD_TIMEOUT, returning what was read.
+        """
+
+        data = b""
+        deadline = time.time() + self.BRD_TIMEOUT
+        timeout = self.__port.timeout
+
+        while terminator not in data:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+
+            self.__port.timeout = remaining
+            chunk = self.__read_chunk()
+            if not chunk:
+                break
+            data += chunk
+
+        self.__port.timeout = timeout
+        return data
+
+
+    def __read_chunk(self):
+        """
+            waits for data, and returns as much as is available.
+            returns empty bytes if nothing arrived before the port's timeout
+        """
+
+        if self.__fd is None:
+            return self.__port.read(self.__port.in_waiting or 1)
+
+        # wait on the file descriptor, rather than polling
+        # byte-by-byte, then pull everything that's arrived
+        while True:
+            try:
+                ready, _, _ = select.select([self.__fd], [], [], self.__port.timeout)
+                if not ready:
+                    return b"" # timeout
+                return os.read(self.__fd, self.READ_SIZE)
+            except (OSError, select.error) as e:
+                # retry on interrupts and spurious wakeups
+                if e.args[0] not in (errno.EAGAIN, errno.EINTR):
+                    import serial
+                    raise serial.SerialException("read failed: %s" % str(e))
+
+
+    @classmethod
+    def split_lines(cls, buffer):
+        """
+            converts the raw bytes of a response into
+            a list of [/r/n] delimited strings
+        """
+
+        framer = LineFramer()
+        framer.feed(buffer)
+        framer.finish()
+        return framer.pop_lines()
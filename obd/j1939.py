@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+
+########################################################################
+#                                                                      #
+# python-OBD: A python OBD-II serial module derived from pyobd         #
+#                                                                      #
+# Copyright 2004 Donour Sizemore (donour@uchicago.edu)                 #
+# Copyright 2009 Secons Ltd. (www.obdtester.com)                       #
+# Copyright 2009 Peter J. Creath                                       #
+# Copyright 2016 Brendan Whitfield (brendan-w.com)                     #
+#                                                                      #
+########################################################################
+#                                                                      #
+# j1939.py                                                             #
+#                                                                      #
+# This file is part of python-OBD (a derivative of pyOBD)              #
+#                                                                      #
+# python-OBD is free software: you can redistribute it and/or modify   #
+# it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation, either version 2 of the License, or    #
+# (at your option) any later version.                                  #
+#                                                                      #
+# python-OBD is distributed in the hope that it will be useful,        #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of       #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the        #
+# GNU General Public License for more details.                         #
+#                                                                      #
+# You should have received a copy of the GNU General Public License    #
+# along with python-OBD.  If not, see <http://www.gnu.org/licenses/>.  #
+#                                                                      #
+########################################################################
+
+import time
+import logging
+from binascii import hexlify, unhexlify
+
+from .utils import isHex
+from .UnitsAndScaling import Unit
+
+logger = logging.getLogger(__name__)
+
+
+def parse_id(can_id):
+    """
+        splits a 29-bit J1939 CAN ID into (priority, pgn, source address)
+
+        priority
+        |   DP PF PS SA
+        18  FE F1    00
+        ^^^ 3 bits
+
+        PDU1 messages (PF < 240) are addressed to one node, and PS holds
+        the destination address rather than being part of the PGN.
+    """
+
+    priority = (can_id >> 26) & 0x07
+    pgn = (can_id >> 8) & 0x3FFFF
+    source = can_id & 0xFF
+
+    if ((pgn >> 8) & 0xFF) < 240:
+        pgn &= 0x3FF00
+
+    return priority, pgn, source
+
+
+class SPN():
+    """
+        A Suspect Parameter Number: one value carried in a PGN's data.
+        J1939 values are little-endian, and the top of each range is
+        reserved for error and "not available" markers.
+    """
+
+    def __init__(self, spn, name, pgn, start, length, scale, unit, offset=0):
+        self.spn = spn
+        self.name = name
+        self.pgn = pgn
+        self.start = start # byte position, 1 based (as in the standard)
+        self.length = length # in bytes
+        self.scale = scale
+        self.unit = unit # name of a pint unit
+        self.offset = offset
+
+    def raw(self, data):
+        """ returns the value held in the given data as a plain number, or None if it's not available """
+
+        _bytes = data[self.start - 1 : self.start - 1 + self.length]
+        if len(_bytes) < self.length:
+            return None
+
+        value = 0
+        for b in reversed(_bytes):
+            value = (value << 8) | b
+
+        # 0xFB - 0xFF in the most significant byte mark errors / not available
+        if value >= (0xFB << (8 * (self.length - 1))):
+            return None
+
+        return value * self.scale + self.offset
+
+    def __call__(self, data):
+        """ returns the value held in the given data as a pint Quantity, or None if it's not available """
+        value = self.raw(data)
+        if value is None:
+            return None
+        return Unit.Quantity(value, self.unit)
+
+    def __str__(self):
+        return "SPN %d: %s" % (self.spn, self.name)
+
+
+# name of each PGN with decoded values
+PGN_NAMES = {
+    0xF003 : "EEC2",   # Electronic Engine Controller 2
+    0xF004 : "EEC1",   # Electronic Engine Controller 1
+    0xFEE0 : "VD",     # Vehicle Distance
+    0xFEE5 : "HOURS",  # Engine Hours, Revolutions
+    0xFEEE : "ET1",    # Engine Temperature 1
+    0xFEEF : "EFL_P1", # Engine Fluid Level/Pressure 1
+    0xFEF1 : "CCVS",   # Cruise Control/Vehicle Speed
+    0xFEF2 : "LFE",    # Fuel Economy (Liquid)
+    0xFEF5 : "AMB",    # Ambient Conditions
+    0xFEF6 : "IC1",    # Inlet/Exhaust Conditions 1
+    0xFEF7 : "VEP1",   # Vehicle Electrical Power 1
+    0xFEFC : "DD",     # Dash Display
+}
+
+SPN_LIST = [
+    #    SPN name                         PGN    start len scale    unit                  offset
+    SPN( 91, "ACCEL_PEDAL_POSITION",      0xF003, 2, 1, 0.4,       "percent"),
+    SPN( 92, "ENGINE_LOAD",               0xF003, 3, 1, 1,         "percent"),
+    SPN(512, "DRIVER_DEMAND_TORQUE",      0xF004, 2, 1, 1,         "percent",             -125),
+    SPN(513, "ACTUAL_ENGINE_TORQUE",      0xF004, 3, 1, 1,         "percent",             -125),
+    SPN(190, "ENGINE_SPEED",              0xF004, 4, 2, 0.125,     "rpm"),
+    SPN(245, "TOTAL_VEHICLE_DISTANCE",    0xFEE0, 5, 4, 0.125,     "kilometer"),
+    SPN(247, "ENGINE_HOURS",              0xFEE5, 1, 4, 0.05,      "hour"),
+    SPN(110, "COOLANT_TEMP",              0xFEEE, 1, 1, 1,         "celsius",             -40),
+    SPN(174, "FUEL_TEMP",                 0xFEEE, 2, 1, 1,         "celsius",             -40),
+    SPN(175, "OIL_TEMP",                  0xFEEE, 3, 2, 0.03125,   "celsius",             -273),
+    SPN(100, "OIL_PRESSURE",              0xFEEF, 4, 1, 4,         "kilopascal"),
+    SPN( 84, "WHEEL_BASED_SPEED",         0xFEF1, 2, 2, 1.0 / 256, "kph"),
+    SPN(183, "FUEL_RATE",                 0xFEF2, 1, 2, 0.05,      "liters_per_hour"),
+    SPN(184, "INSTANT_FUEL_ECONOMY",      0xFEF2, 3, 2, 1.0 / 512, "kilometer / liter"),
+    SPN(108, "BAROMETRIC_PRESSURE",       0xFEF5, 1, 1, 0.5,       "kilopascal"),
+    SPN(171, "AMBIENT_AIR_TEMP",          0xFEF5, 4, 2, 0.03125,   "celsius",             -273),
+    SPN(102, "BOOST_PRESSURE",            0xFEF6, 2, 1, 2,         "kilopascal"),
+    SPN(105, "INTAKE_MANIFOLD_TEMP",      0xFEF6, 3, 1, 1,         "celsius",             -40),
+    SPN(168, "BATTERY_VOLTAGE",           0xFEF7, 5, 2, 0.05,      "volt"),
+    SPN( 96, "FUEL_LEVEL",                0xFEFC, 2, 1, 0.4,       "percent"),
+]
+
+# dict for looking up the SPNs carried by each PGN
+SPNS = {}
+for spn in SPN_LIST:
+    SPNS.setdefault(spn.pgn, []).append(spn)
+
+
+class J1939Message(object):
+    """ a single broadcast J1939 message, as seen while monitoring the bus """
+
+    def __init__(self, priority, pgn, source, data, units=True):
+        self.priority = priority
+        self.pgn = pgn
+        self.source = source # source address of the sending node
+        self.data = data
+        self.units = units # False to decode plain numbers, rather than pint Quantities
+        self.time = time.time()
+
+    @property
+    def name(self):
+        return PGN_NAMES.get(self.pgn, "")
+
+    @property
+    def values(self):
+        """ dict of the decoded SPN values, keyed by name """
+        if self.units:
+            return dict([ (spn.name, spn(self.data)) for spn in SPNS.get(self.pgn, []) ])
+        else:
+            return dict([ (spn.name, spn.raw(self.data)) for spn in SPNS.get(self.pgn, []) ])
+
+    def __str__(self):
+        return "%s (PGN %d) from %02X: %s" % (self.name or "?", self.pgn, self.source, hexlify(self.data).decode())
+
+
+def parse_line(line, units=True):
+    """
+        parses a line printed by the ELM while monitoring the bus,
+        with its J1939 header formatting off:
+
+        18FEF100 FF FF FF 12 34 FF FF FF
+        [  ID  ] [        data         ]
+
+        returns a J1939Message, or None for anything that isn't a frame.
+        units=False makes its values plain numbers (see SPN.raw())
+    """
+
+    line = line.replace(" ", "")
+
+    # an 8 digit ID followed by 0-8 bytes of data
+    if (len(line) < 8) or (len(line) > 24) or (len(line) & 1) or not isHex(line):
+        return None
+
+    priority, pgn, source = parse_id(int(line[:8], 16))
+    return J1939Message(priority, pgn, source, bytearray(unhexlify(line[8:])), units)
@@ -37,7 +37,10 @@ from .__version__ import __version__
 from .elm327 import ELM327
 from .commands import commands
 from .OBDResponse import OBDResponse
-from .utils import scan_serial, OBDStatus
+from .protocols.protocol import Message, ECU
+from .profiles import ProfileStore, decode_vin
+from . import j1939
+from .utils import scan_serial, run_parallel, OBDStatus
 
 logger = logging.getLogger(__name__)
 
@@ -48,20 +51,138 @@ class OBD(object):
         with it's assorted commands/sensors.
     """
 
-    def __init__(self, portstr=None, baudrate=None, protocol=None, fast=True):
+    # the ELM327 accepts up to six mode 01 PIDs in a single CAN request
+    MAX_PIDS_PER_REQUEST = 6
+
+    # seconds to wait for any port to answer, when searching for an adapter
+    PROBE_TIMEOUT = 10
+
+    def __init__(self, portstr=None, baudrate=None, protocol=None, fast=True, tune_timeout=False, low_latency=False, profile=None, max_baudrate=None, reset="full", units=True):
         self.interface = None
         self.supported_commands = set(commands.base_commands())
         self.fast = fast # global switch for disabling optimizations
+        self.units = units # False to decode plain numbers, rather than pint Quantities
         self.__last_command = b"" # used for running the previous command with a CR
-        self.__frame_counts = {} # keeps track of the number of return frames for each command
+        self.__frame_counts = {} # keeps track of the number of return frames, key = (OBDCommand, target tx_id)
+        self.__target = ECU.ALL # the ECU that requests were last addressed to (see __set_target())
+        self.__profiles = None if profile is None else ProfileStore(profile)
+        self.__vin = "" # the VIN that the current profile is saved under
 
         logger.info("======================= python-OBD (v%s) =======================" % __version__)
-        self.__connect(portstr, baudrate, protocol) # initialize by connecting and loading sensors
-        self.__load_commands()            # try to load the car's supported commands
+        if not self.__resume(portstr, baudrate, protocol, tune_timeout, low_latency, max_baudrate, reset):
+            self.__connect(portstr, baudrate, protocol, tune_timeout, low_latency, max_baudrate, reset) # initialize by connecting and loading sensors
+            self.__load_commands()            # try to load the car's supported commands
+            self.__save_profile(read_vin=True)
         logger.info("===================================================================")
 
 
-    def __connect(self, portstr, baudrate, protocol):
+    def __resume(self, portstr, baudrate, protocol, tune_timeout, low_latency, max_baudrate, reset):
+        """
+            Reconnects using a saved profile, skipping the baudrate
+            detection, protocol search and supported PID sweep.
+
+            Returns False when no saved profile fits the car,
+            in which case a full discovery should be run.
+        """
+
+        if self.__profiles is None:
+            return False
+
+        ports = [portstr] if portstr is not None else self.__profiles.ports()
+
+        for port in ports:
+            saved = self.__profiles.latest(port)
+            if saved is None:
+                continue
+
+            logger.info("Resuming saved profile for port: %s" % port)
+            self.interface = ELM327(port,
+                                    baudrate or saved.get("baudrate"),
+                                    protocol or saved.get("protocol"),
+                                    tune_timeout,
+                                    low_latency,
+                                    max_baudrate,
+                                    reset)
+
+            # the 0100 sent while setting the protocol is the only check:
+            # the same ECUs must give the same answers as last time
+            if self.interface.status() == OBDStatus.CAR_CONNECTED:
+                vin, saved = self.__profiles.find(port,
+                                                  self.interface.protocol_id(),
+                                                  self.interface.fingerprint())
+                if saved is not None:
+                    self.__apply_profile(vin, saved)
+                    logger.info("Resumed profile with %d commands supported" % len(self.supported_commands))
+                    return True
+
+            logger.info("Saved profile doesn't match the car on %s, running full discovery" % port)
+            self.interface.close()
+            self.interface = None
+
+        return False
+
+
+    def __apply_profile(self, vin, profile):
+        """ loads the supported commands and frame counts from a saved profile """
+
+        self.__vin = vin
+
+        for name in profile.get("supported", []):
+            if commands.has_name(name):
+                self.supported_commands.add(commands[name])
+
+        for name, counts in profile.get("frame_counts", {}).items():
+            if commands.has_name(name) and isinstance(counts, dict):
+                for target, count in counts.items():
+                    target = None if target == "all" else int(target)
+                    self.__frame_counts[(commands[name], target)] = count
+
+
+    def __save_profile(self, read_vin=False):
+        """
+            Saves what has been learned about the car, so that the
+            next connection can skip discovery. Only commands from
+            the builtin tables are saved.
+        """
+
+        if (self.__profiles is None) or not self.is_connected():
+            return
+
+        if read_vin:
+            self.__vin = self.__read_vin()
+
+        # frame counts depend on the addressing, so they're saved per target
+        frame_counts = {}
+        for (c, target), n in self.__frame_counts.items():
+            if commands.has_name(c.name):
+                frame_counts.setdefault(c.name, {})["all" if target is None else str(target)] = n
+
+        profile = {
+            "baudrate"     : self.interface.boot_baudrate(),
+            "protocol"     : self.interface.protocol_id(),
+            "ecus"         : self.interface.fingerprint(),
+            "supported"    : sorted([ c.name for c in self.supported_commands if commands.has_name(c.name) ]),
+            "frame_counts" : frame_counts,
+        }
+
+        self.__profiles.save(self.port_name(), self.__vin, profile)
+
+
+    def __read_vin(self):
+        """
+            Requests the VIN (mode 09, PID 02), which isn't
+            in the command tables yet. Returns an empty string
+            if the car didn't answer.
+        """
+        self.__set_target([])
+        messages = self.interface.send_and_parse(b"0902")
+        self.__last_command = b"0902"
+        vin = decode_vin(messages)
+        logger.info("VIN: %s" % (vin or "unknown"))
+        return vin
+
+
+    def __connect(self, portstr, baudrate, protocol, tune_timeout, low_latency, max_baudrate, reset):
         """
             Attempts to instantiate an ELM327 connection object.
         """
@@ -75,15 +196,23 @@ class OBD(object):
                 logger.warning("No OBD-II adapters found")
                 return
 
-            for port in portnames:
-                logger.info("Attempting to use port: " + str(port))
-                self.interface = ELM327(port, baudrate, protocol)
+            # look for an ELM prompt on all of the ports at once,
+            # and use the first one that answers
+            def probe(port):
+                return ELM327.probe(port, baudrate)
+
+            found = run_parallel(probe, portnames, self.PROBE_TIMEOUT, first=True)
 
-                if self.interface.status() >= OBDStatus.ELM_CONNECTED:
-                    break # success! stop searching for serial
+            if not found:
+                logger.warning("No OBD-II adapters answered")
+                return
+
+            port, baudrate = found[0]
+            logger.info("Attempting to use port: %s (baud %d)" % (port, baudrate))
+            self.interface = ELM327(port, baudrate, protocol, tune_timeout, low_latency, max_baudrate, reset)
         else:
             logger.info("Explicit port defined")
-            self.interface = ELM327(portstr, baudrate, protocol)
+            self.interface = ELM327(portstr, baudrate, protocol, tune_timeout, low_latency, max_baudrate, reset)
 
         # if the connection failed, close it
         if self.interface.status() == OBDStatus.NOT_CONNECTED:
@@ -139,6 +268,9 @@ class OBD(object):
             Closes the connection, and clears supported_commands
         """
 
+        # keep the frame counts learned during this connection
+        self.__save_profile()
+
         self.supported_commands = set()
 
         if self.interface is not None:
@@ -181,6 +313,29 @@ class OBD(object):
             return self.interface.protocol_id()
 
 
+    def startup_stats(self):
+        """
+            Returns the seconds that connecting took: until the adapter
+            was reset, until its first response, and until the car's.
+        """
+        if self.interface is None:
+            return {}
+        else:
+            return self.interface.startup_stats()
+
+
+    def timeout_stats(self):
+        """
+            Returns the response timeouts chosen by the adapter's
+            timeout tuner, and the timings they were based on.
+            Empty unless the connection was made with tune_timeout=True.
+        """
+        if self.interface is None:
+            return {}
+        else:
+            return self.interface.timeout_stats()
+
+
     def port_name(self):
         """ Returns the name of the currently connected port """
         if self.interface is not None:
@@ -252,7 +407,9 @@ class OBD(object):
 
         # send command and retrieve message
         logger.info("Sending command: %s" % str(cmd))
-        cmd_string = self.__build_command_string(cmd)
+        self.__set_target([cmd])
+        key = (cmd, self.interface.target()) # frame counts differ between physical and functional requests
+        cmd_string = self.__build_command_string(cmd, key)
         messages = self.interface.send_and_parse(cmd_string)
 
         # if we're sending a new command, note it
@@ -263,25 +420,202 @@ class OBD(object):
 
         # if we don't already know how many frames this command returns,
         # log it, so we can specify it next time
-        if cmd not in self.__frame_counts:
-            self.__frame_counts[cmd] = sum([len(m.frames) for m in messages])
+        if key not in self.__frame_counts:
+            self.__frame_counts[key] = sum([len(m.frames) for m in messages])
 
         if not messages:
             logger.info("No valid OBD Messages returned")
             return OBDResponse()
 
-        return cmd(messages) # compute a response object
+        return cmd(messages, self.units) # compute a response object
+
+
+    def monitor(self, pgns=None):
+        """
+            J1939 only: listens to the messages broadcast on the bus,
+            rather than polling. Yields a J1939Message for each one,
+            for as long as the generator is iterated.
+
+            pgns limits the stream to the given PGNs. A single PGN is
+            filtered by the adapter (AT MP), otherwise the whole bus
+            is monitored (AT MA) and filtered here.
+        """
+
+        if self.status() == OBDStatus.NOT_CONNECTED:
+            logger.warning("Monitor failed, no connection available")
+            return
+
+        if self.protocol_id() != "A":
+            logger.warning("Monitoring PGNs requires the SAE J1939 protocol")
+            return
+
+        pgns = set(pgns or [])
+        pgn = list(pgns)[0] if len(pgns) == 1 else None
+
+        self.__set_target([]) # a receive filter would also hide the bus traffic
+        for line in self.interface.monitor(pgn):
+            message = j1939.parse_line(line, self.units)
+            if (message is not None) and (not pgns or message.pgn in pgns):
+                yield message
+
+
+    def query_many(self, cmds, force=False):
+        """
+            Sends a list of commands to the car, packing mode 01
+            PIDs into shared requests where the protocol allows it.
+
+            Returns a list of OBDResponses, in the same order as
+            the given commands.
+        """
+
+        if self.status() == OBDStatus.NOT_CONNECTED:
+            logger.warning("Query failed, no connection available")
+            return [ OBDResponse() for c in cmds ]
+
+        responses = {}
+
+        # the commands are sent in batches per target ECU, so that the adapter's
+        # addressing only changes once per target, starting with the current one
+        targets = []
+        for c in cmds:
+            target = self.__target_of([c])
+            if target not in targets:
+                targets.append(target)
+        targets.sort(key=lambda t: t != self.__target)
+
+        for target in targets:
+            batch = [ c for c in cmds if self.__target_of([c]) == target ]
+
+            # only the CAN protocols allow multiple PIDs in one request
+            if self.interface.protocol_id() in ["6", "7", "8", "9"]:
+                packable = []
+                for c in batch:
+                    if (c.mode == 1) and (c.pid is not None) and \
+                       (c not in packable) and \
+                       (force or self.test_cmd(c, warn=False)):
+                        packable.append(c)
+
+                n = self.MAX_PIDS_PER_REQUEST
+                for group in [ packable[i:i+n] for i in range(0, len(packable), n) ]:
+                    if len(group) == 1:
+                        continue # leave lone commands to the normal query()
+                    responses.update(self.__query_group(group))
+
+            # anything that couldn't be packed is sent on its own
+            # when querying, only use the blocking OBD.query() (see __load_commands)
+            for c in batch:
+                if c not in responses:
+                    responses[c] = OBD.query(self, c, force=force)
+
+        return [ responses[c] for c in cmds ]
+
+
+    def __query_group(self, cmds):
+        """
+            Sends several mode 01 commands as a single request, and
+            splits the reply into one response per command.
+
+            returns a dict of { OBDCommand : OBDResponse }
+        """
+
+        # ex: 010C0D0511
+        cmd_string = b"01" + b"".join([ c.command[2:] for c in cmds ])
+
+        logger.info("Sending commands: %s" % ", ".join([ str(c) for c in cmds ]))
+        self.__set_target(cmds)
+
+        if self.fast and (cmd_string == self.__last_command):
+            messages = self.interface.send_and_parse(b"")
+        else:
+            messages = self.interface.send_and_parse(cmd_string)
+            self.__last_command = cmd_string
+
+        # key = OBDCommand, value = list of Messages (one per ECU)
+        segments = dict([ (c, []) for c in cmds ])
+        by_pid = dict([ (c.pid, c) for c in cmds ])
+
+        for message in (messages or []):
+            for c, segment in self.__split_message(message, by_pid):
+                segments[c].append(segment)
+
+        responses = {}
+        for c in cmds:
+            if segments[c]:
+                responses[c] = c(segments[c], self.units) # compute a response object
+            else:
+                logger.info("No valid OBD Messages returned for %s" % str(c))
+                responses[c] = OBDResponse()
+
+        return responses
+
+
+    def __split_message(self, message, by_pid):
+        """
+            Splits a multi-PID response into single-PID messages,
+            using the expected size of each command.
+
+            41 0C 1A F8 0D 3C 05 7B
+            [] [PID+data] [PID+data] ...
+        """
+
+        data = message.data
+        if (len(data) < 2) or (data[0] != 0x41):
+            return []
+
+        segments = []
+        i = 1 # skip the shared mode byte
+        while i < len(data):
+            c = by_pid.get(data[i])
+
+            if c is None:
+                # without a known size, the rest of the data can't be trusted
+                logger.debug("Unexpected PID in multi-PID response: %d" % data[i])
+                break
+
+            # the command's size includes the mode and PID bytes
+            size = max(c.bytes - 1, 1)
+            if i + size > len(data):
+                logger.debug("Multi-PID response was shorter than expected")
+                break
+
+            segment = Message(message.frames)
+            segment.ecu = message.ecu
+            segment.data = bytearray([0x41]) + data[i:i+size]
+            segments.append((c, segment))
+
+            i += size
+
+        return segments
+
+
+    def __target_of(self, cmds):
+        """
+            When every command only wants one ECU's answer, returns that
+            ECU, so that the others can stay quiet. Otherwise (or with
+            fast mode off) returns ECU.ALL, for functional requests.
+        """
+        ecus = set([ c.ecu for c in cmds ])
+        if self.fast and len(ecus) == 1:
+            return ecus.pop()
+        else:
+            return ECU.ALL
+
+
+    def __set_target(self, cmds):
+        """ asks the adapter to address the following request(s) for these commands """
+        self.__target = self.__target_of(cmds)
+        self.interface.set_target(self.__target)
 
 
-    def __build_command_string(self, cmd):
+    def __build_command_string(self, cmd, key):
         """ assembles the appropriate command string """
         cmd_string = cmd.command
 
         # if we know the number of frames that this command returns,
         # only wait for exactly that number. This avoids some harsh
         # timeouts from the ELM, thus speeding up queries.
-        if self.fast and cmd.fast and (cmd in self.__frame_counts):
-            cmd_string += str(self.__frame_counts[cmd]).encode()
+        if self.fast and cmd.fast and (key in self.__frame_counts):
+            cmd_string += str(self.__frame_counts[key]).encode()
 
         # if we sent this last time, just send a CR
         # (CR is added by the ELM327 class)
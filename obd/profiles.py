@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+
+########################################################################
+#                                                                      #
+# python-OBD: A python OBD-II serial module derived from pyobd         #
+#                                                                      #
+# Copyright 2004 Donour Sizemore (donour@uchicago.edu)                 #
+# Copyright 2009 Secons Ltd. (www.obdtester.com)                       #
+# Copyright 2009 Peter J. Creath                                       #
+# Copyright 2016 Brendan Whitfield (brendan-w.com)                     #
+#                                                                      #
+########################################################################
+#                                                                      #
+# profiles.py                                                          #
+#                                                                      #
+# This file is part of python-OBD (a derivative of pyOBD)              #
+#                                                                      #
+# python-OBD is free software: you can redistribute it and/or modify   #
+# it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation, either version 2 of the License, or    #
+# (at your option) any later version.                                  #
+#                                                                      #
+# python-OBD is distributed in the hope that it will be useful,        #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of       #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the        #
+# GNU General Public License for more details.                         #
+#                                                                      #
+# You should have received a copy of the GNU General Public License    #
+# along with python-OBD.  If not, see <http://www.gnu.org/licenses/>.  #
+#                                                                      #
+########################################################################
+
+import os
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# characters allowed in a VIN (I, O and Q are never used)
+VIN_CHARS = "0123456789ABCDEFGHJKLMNPRSTUVWXYZ"
+
+
+def decode_vin(messages):
+    """
+        Extracts the VIN from the response to 0902. Both the CAN and
+        legacy layouts carry the 17 characters at the end of the data,
+        after the mode/PID bytes and any padding.
+
+        returns an empty string when no VIN was found
+    """
+    for message in (messages or []):
+        data = message.data
+        if len(data) < 19 or data[0] != 0x49 or data[1] != 0x02:
+            continue
+        vin = "".join([ chr(b) for b in data[2:] if chr(b) in VIN_CHARS ])
+        if len(vin) >= 17:
+            return vin[-17:]
+    return ""
+
+
+class ProfileStore(object):
+    """
+        Remembers what was learned about each vehicle while connecting,
+        so that a reconnect can skip the discovery process.
+
+        Profiles are kept in a JSON file, keyed by port and then VIN:
+
+        {
+            "/dev/ttyUSB0" : {
+                "1D4GP00R55B123456" : {
+                    "baudrate"     : 38400,
+                    "protocol"     : "6",
+                    "ecus"         : { "2024" : { "ecu" : 2, "0100" : "4100be3eb811" } },
+                    "supported"    : [ "RPM", "SPEED", ... ],
+                    "frame_counts" : { "RPM" : { "0" : 1 }, "GET_DTC" : { "all" : 2 }, ... },
+                    "saved"        : 1476799200.0
+                }
+            }
+        }
+
+        "ecus" holds the ECU map, along with each ECU's answer to 0100,
+        which is compared against the car on reconnect (see OBD.__resume()).
+        "frame_counts" are kept per request target: the tx_id of the ECU
+        that was addressed, or "all" for functional requests.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+
+    def ports(self):
+        """ returns the ports that have saved profiles, most recently used first """
+        profiles = self.__load()
+        ports = [ port for port in profiles if profiles[port] ]
+        return sorted(ports, key=lambda port: -self.__newest(profiles[port])[1].get("saved", 0))
+
+
+    def latest(self, port):
+        """ returns the most recently saved profile for the given port, or None """
+        vins = self.__load().get(port)
+        if not vins:
+            return None
+        return self.__newest(vins)[1]
+
+
+    def find(self, port, protocol, ecus):
+        """
+            returns (vin, profile) for the saved profile on this port
+            that matches the given protocol and ECU answers,
+            or (None, None) if there isn't one
+        """
+        for vin, profile in self.__load().get(port, {}).items():
+            if profile.get("protocol") == protocol and profile.get("ecus") == ecus:
+                return (vin, profile)
+        return (None, None)
+
+
+    def save(self, port, vin, profile):
+        """ stores the profile for the given port and VIN, replacing any older one """
+        profiles = self.__load()
+        profile = dict(profile, saved=time.time())
+        profiles.setdefault(port, {})[vin] = profile
+
+        # write a new file and move it into place,
+        # so that a crash can't leave a truncated file
+        import json # only loaded when profiles are used
+
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(profiles, f, indent=1, sort_keys=True)
+            getattr(os, "replace", os.rename)(tmp, self.path)
+        except (IOError, OSError) as e:
+            logger.warning("Failed to save connection profile: %s" % str(e))
+
+
+    def __newest(self, vins):
+        return max(vins.items(), key=lambda item: item[1].get("saved", 0))
+
+
+    def __load(self):
+        if not os.path.exists(self.path):
+            return {}
+
+        import json
+
+        try:
+            with open(self.path) as f:
+                profiles = json.load(f)
+        except (IOError, OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable profile file %s: %s" % (self.path, str(e)))
+            return {}
+        return profiles if isinstance(profiles, dict) else {}
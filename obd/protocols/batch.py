@@ -0,0 +1,402 @@
+# -*- coding: utf-8 -*-
+
+########################################################################
+#                                                                      #
+# python-OBD: A python OBD-II serial module derived from pyobd         #
+#                                                                      #
+# Copyright 2004 Donour Sizemore (donour@uchicago.edu)                 #
+# Copyright 2009 Secons Ltd. (www.obdtester.com)                       #
+# Copyright 2009 Peter J. Creath                                       #
+# Copyright 2015 Brendan Whitfield (bcw7044@rit.edu)                   #
+#                                                                      #
+########################################################################
+#                                                                      #
+# protocols/batch.py                                                   #
+#                                                                      #
+# This file is part of python-OBD (a derivative of pyOBD)              #
+#                                                                      #
+# python-OBD is free software: you can redistribute it and/or modify   #
+# it under the terms of the GNU General Public License as published by #
+# the Free Software Foundation, either version 2 of the License, or    #
+# (at your option) any later version.                                  #
+#                                                                      #
+# python-OBD is distributed in the hope that it will be useful,        #
+# but WITHOUT ANY WARRANTY; without even the implied warranty of       #
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the        #
+# GNU General Public License for more details.                         #
+#                                                                      #
+# You should have received a copy of the GNU General Public License    #
+# along with python-OBD.  If not, see <http://www.gnu.org/licenses/>.  #
+#                                                                      #
+########################################################################
+
+"""
+
+Vectorized parsing of recorded CAN responses, for offline analysis.
+
+Rather than building Frame and Message objects line by line, whole
+arrays of lines are decoded in a handful of NumPy passes. Requires numpy
+(pip install obd[batch]), which the rest of python-OBD doesn't need.
+
+    frames = parse_frames(lines, protocol)
+    messages, payload = parse_messages(lines, protocol, responses)
+
+    for m in messages:
+        data = payload[m["offset"] : m["offset"] + m["length"]]
+
+    # or, decode one command's messages all at once
+    rows = payload_rows(messages, payload, obd.commands.RPM.bytes)
+    values, valid = obd.commands.RPM.decode_batch(rows)
+
+Lines are the raw strings returned by the ELM327 (with or without spaces),
+and the protocol is a CANProtocol instance, usually the connection's.
+
+"""
+
+import numpy as np
+
+from .protocol import Frame, Message, ECU
+from .protocol_can import CANProtocol
+
+
+# one entry per line
+FRAME_DTYPE = np.dtype([
+    ("valid",     np.bool_),     # False if the general parser would drop the frame
+    ("priority",  np.uint8),
+    ("addr_mode", np.uint8),
+    ("rx_id",     np.uint8),
+    ("tx_id",     np.uint8),
+    ("type",      np.uint8),     # CANProtocol.FRAME_TYPE_*
+    ("seq_index", np.uint8),     # CF only
+    ("data_len",  np.uint16),    # SF and FF only
+    ("length",    np.uint8),     # number of bytes in "data"
+    ("data",      np.uint8, 8),  # PCI byte(s) and data, zero padded
+])
+
+# one entry per message, whose data is payload[offset:offset+length]
+MESSAGE_DTYPE = np.dtype([
+    ("response", np.int64),      # which response (command) the message belongs to
+    ("line",     np.int64),      # index of the message's first line
+    ("tx_id",    np.uint8),
+    ("ecu",      np.uint8),      # ECU constant, from the protocol's ecu_map
+    ("offset",   np.int64),
+    ("length",   np.uint16),
+])
+
+
+# ASCII -> nibble value, 255 for anything that isn't a hex digit.
+# Rows are padded with zeros, which decode as zero nibbles.
+_NIBBLES = np.full(256, 255, dtype=np.uint8)
+_NIBBLES[0] = 0
+for _i, _c in enumerate(bytearray(b"0123456789ABCDEF")):
+    _NIBBLES[_c] = _i
+for _i, _c in enumerate(bytearray(b"abcdef")):
+    _NIBBLES[_c] = 10 + _i
+
+
+def _as_chars(lines, width):
+    """
+        converts lines to a 2D array of ASCII codes, with spaces removed.
+        Rows are zero padded (or cut) to the given width.
+        Returns (chars, lengths)
+    """
+
+    lines = np.asarray(lines)
+    if lines.dtype.kind == "U":
+        lines = np.char.encode(lines, "ascii")
+    elif lines.dtype.kind != "S":
+        lines = np.array([ l.encode() if hasattr(l, "encode") else l for l in lines ], dtype=np.bytes_)
+
+    n = len(lines)
+    itemsize = lines.dtype.itemsize
+    if (n == 0) or (itemsize == 0):
+        return np.zeros((n, width), dtype=np.uint8), np.zeros(n, dtype=np.int64)
+
+    raw = np.ascontiguousarray(lines).view(np.uint8).reshape(n, itemsize)
+
+    if (raw == ord(" ")).any():
+        lines = np.char.replace(lines, b" ", b"")
+        itemsize = lines.dtype.itemsize
+        raw = np.ascontiguousarray(lines).view(np.uint8).reshape(n, itemsize)
+
+    lengths = np.count_nonzero(raw, axis=1)
+
+    if itemsize >= width:
+        chars = np.ascontiguousarray(raw[:, :width])
+    else:
+        chars = np.zeros((n, width), dtype=np.uint8)
+        chars[:, :itemsize] = raw
+    return chars, lengths
+
+
+def _decode(lines, protocol):
+    """
+        the vectorized equivalent of CANProtocol.parse_frame()
+        returns a dict of columns, named after FRAME_DTYPE's fields
+    """
+
+    if not isinstance(protocol, CANProtocol):
+        raise ValueError("Batch parsing is only implemented for the CAN protocols")
+
+    # hex digits in the header, followed by up to 8 bytes of data
+    h = 3 if protocol.id_bits == 11 else 8
+    width = h + 16
+
+    chars, lengths = _as_chars(lines, width)
+    nibbles = np.take(_NIBBLES, chars)
+    n_data = (lengths - h) // 2
+
+    # same size checks as parse_frame(): 2 - 8 bytes after the header
+    valid = ~(nibbles == 255).any(axis=1)
+    valid &= ((lengths - h) % 2 == 0) & (n_data >= 2) & (n_data <= 8)
+
+    data = (nibbles[:, h::2] << 4) | nibbles[:, h+1::2]
+    columns = { "data" : data, "length" : np.clip(n_data, 0, 8).astype(np.uint8) }
+
+    # ------------------------------ header ------------------------------
+    if protocol.id_bits == 11:
+        # 7 E8 --> 00 00 07 E8
+        b2 = nibbles[:, 0]
+        b3 = (nibbles[:, 1] << 4) | nibbles[:, 2]
+
+        functional = (b3 & 0xF0) == 0xD0
+        from_ecu = ~functional & ((b3 & 0x08) != 0)
+
+        columns["priority"]  = b2 & 0x0F
+        columns["addr_mode"] = b3 & 0xF0
+        columns["rx_id"]     = np.where(functional, b3 & 0x0F, np.where(from_ecu, 0xF1, b3 & 0x07)).astype(np.uint8)
+        columns["tx_id"]     = np.where(from_ecu, b3 & 0x07, 0xF1).astype(np.uint8)
+    else:
+        header = (nibbles[:, 0:8:2] << 4) | nibbles[:, 1:8:2]
+        columns["priority"]  = header[:, 0]
+        columns["addr_mode"] = header[:, 1]
+        columns["rx_id"]     = header[:, 2]
+        columns["tx_id"]     = header[:, 3]
+
+    # ------------------------------- PCI --------------------------------
+    pci = data[:, 0]
+    frame_type = pci & 0xF0
+
+    sf = frame_type == CANProtocol.FRAME_TYPE_SF
+    ff = frame_type == CANProtocol.FRAME_TYPE_FF
+    cf = frame_type == CANProtocol.FRAME_TYPE_CF
+
+    # SF: 4 bit length, FF: 12 bit length
+    data_len = np.where(ff, (pci & 0x0F).astype(np.uint16) << 8, 0) + np.where(ff, data[:, 1], pci & 0x0F)
+    data_len = np.where(sf | ff, data_len, 0).astype(np.uint16)
+
+    # frames of unknown types, and empty SF/FF frames are dropped
+    valid &= (sf | ff | cf) & ~((sf | ff) & (data_len == 0))
+
+    columns["type"]      = frame_type
+    columns["seq_index"] = np.where(cf, pci & 0x0F, 0).astype(np.uint8)
+    columns["data_len"]  = data_len
+    columns["valid"]     = valid
+
+    return columns
+
+
+def parse_frames(lines, protocol):
+    """
+        Parses each line into a frame, the same way as CANProtocol.parse_frame().
+        Returns an array of FRAME_DTYPE, with one entry per line. When an
+        entry isn't valid, its other fields are meaningless.
+    """
+
+    columns = _decode(lines, protocol)
+    frames = np.zeros(len(columns["valid"]), dtype=FRAME_DTYPE)
+    for name in FRAME_DTYPE.names:
+        frames[name] = columns[name]
+    return frames
+
+
+def parse_messages(lines, protocol, responses=None):
+    """
+        Parses lines into messages, the same way as calling the protocol
+        on each response. "responses" gives the index of the response that
+        each line belongs to (by default, every line is its own response).
+
+        Returns (messages, payload): an array of MESSAGE_DTYPE ordered by
+        first line, and the uint8 array holding the data of every message.
+        Lines that aren't CAN frames (ie: "NO DATA") don't produce messages.
+    """
+
+    columns = _decode(lines, protocol)
+    n = len(columns["valid"])
+    tx_ids = columns["tx_id"]
+
+    if responses is None:
+        responses = np.arange(n, dtype=np.int64)
+    else:
+        responses = np.asarray(responses, dtype=np.int64)
+        if len(responses) != n:
+            raise ValueError("responses must have one entry per line")
+
+    # group valid frames by response and transmitting ECU,
+    # and find the groups made of a single frame
+    used = np.flatnonzero(columns["valid"])
+    keys = responses[used] * 256 + tx_ids[used]
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    starts = np.ones(len(used), dtype=np.bool_)
+    starts[1:] = sorted_keys[1:] != sorted_keys[:-1]
+    ends = np.ones(len(used), dtype=np.bool_)
+    ends[:-1] = starts[1:]
+
+    lone = np.zeros(len(used), dtype=np.bool_)
+    lone[order] = starts & ends
+
+    # ---------------------- single frames (vectorized) ----------------------
+    is_sf = columns["type"][used] == CANProtocol.FRAME_TYPE_SF
+    sf = used[lone & is_sf]
+
+    # ignore the PCI byte, and anything after the marked length
+    lengths = np.minimum(columns["data_len"][sf], columns["length"][sf].astype(np.int64) - 1)
+    data = columns["data"][sf, 1:]
+
+    # trim DTC responses based on the DTC count (see CANProtocol.parse_message())
+    dtc = (data[:, 0] == 0x43) & (lengths >= 2)
+    lengths[dtc] = np.minimum(lengths[dtc], data[dtc, 1].astype(np.int64) * 2 + 2)
+
+    sf_payload = data[np.arange(7) < lengths[:, None]]
+    sf_offsets = np.cumsum(lengths) - lengths
+
+    # ------------------ multi-frame groups (ISO-TP, per group) ------------------
+    mf_lines = []
+    mf_data = []
+
+    multi = used[order[~(starts & ends)]]
+    if len(multi):
+        groups = {}
+        for i in multi:
+            groups.setdefault((responses[i], tx_ids[i]), []).append(i)
+
+        for indices in groups.values():
+            indices.sort() # in the order they arrived
+            message = Message([ _to_frame(columns, i) for i in indices ])
+            if protocol.parse_message(message):
+                mf_lines.append(indices[0])
+                mf_data.append(bytes(message.data))
+
+    # ------------------------------ assemble ------------------------------
+    mf_lengths = np.array([ len(d) for d in mf_data ], dtype=np.int64)
+    mf_offsets = len(sf_payload) + np.cumsum(mf_lengths) - mf_lengths
+
+    payload = np.concatenate([ sf_payload, np.frombuffer(b"".join(mf_data), dtype=np.uint8) ])
+
+    first_lines = np.concatenate([ sf, np.array(mf_lines, dtype=np.int64) ])
+    messages = np.zeros(len(first_lines), dtype=MESSAGE_DTYPE)
+    messages["line"]     = first_lines
+    messages["response"] = responses[first_lines]
+    messages["tx_id"]    = tx_ids[first_lines]
+    messages["offset"]   = np.concatenate([ sf_offsets, mf_offsets ])
+    messages["length"]   = np.concatenate([ lengths, mf_lengths ])
+
+    ecus = np.full(256, ECU.UNKNOWN, dtype=np.uint8)
+    for tx_id, ecu in protocol.ecu_map.items():
+        if tx_id is not None:
+            ecus[tx_id] = ecu
+    messages["ecu"] = ecus[messages["tx_id"]]
+
+    if len(mf_lines):
+        messages = messages[np.argsort(messages["line"], kind="stable")]
+
+    return messages, payload
+
+
+def _to_frame(columns, i):
+    """ builds a Frame from the i'th entry of the decoded columns """
+    frame = Frame("")
+    for name in ["priority", "addr_mode", "rx_id", "tx_id", "type", "seq_index", "data_len"]:
+        setattr(frame, name, int(columns[name][i]))
+    frame.data = bytearray(columns["data"][i, :columns["length"][i]].tobytes())
+    return frame
+
+
+def payload_rows(messages, payload, width):
+    """
+        Copies the data of each message (from parse_messages()) into the
+        rows of a 2-D uint8 array, chopped or zero padded to the given width
+    """
+
+    lengths = np.minimum(messages["length"].astype(np.int64), width)
+    columns = np.arange(width)
+    mask = columns < lengths[:, None]
+    rows = np.zeros((len(messages), width), dtype=np.uint8)
+    rows[mask] = payload[(messages["offset"][:, None] + columns)[mask]]
+    return rows
+
+
+def decode_payloads(command, payloads):
+    """
+        Decodes a 2-D array of payloads (one message's data per row, mode
+        and PID included) with the given command's decoder. See
+        OBDCommand.decode_batch().
+
+        Returns (values, valid): a float64 array of plain numbers, in the
+        command's unit, and a mask of the rows holding a response to this
+        command. Invalid rows are NaN.
+    """
+
+    if (getattr(command.decode, "unit", None) is None) or (command.bytes <= 0):
+        raise ValueError("%s doesn't decode to a number" % command.name)
+
+    payloads = np.asarray(payloads, dtype=np.uint8)
+    if payloads.ndim != 2:
+        raise ValueError("payloads must be a 2-D array, with one message per row")
+
+    # chop or pad to the command's size, as OBDCommand.__call__ does
+    n = len(payloads)
+    width = command.bytes
+    if payloads.shape[1] >= width:
+        payloads = payloads[:, :width]
+    else:
+        payloads = np.hstack([ payloads, np.zeros((n, width - payloads.shape[1]), dtype=np.uint8) ])
+
+    # rows must echo the command's mode and PID
+    valid = np.ones(n, dtype=np.bool_)
+    if command.mode is not None:
+        valid &= payloads[:, 0] == (0x40 + command.mode)
+    if command.pid is not None:
+        valid &= payloads[:, 1] == command.pid
+
+    values = np.full(n, np.nan)
+    layout = getattr(command.decode, "layout", None)
+    start = 2 + (layout.start if layout is not None else 0)
+    length = 0
+    if layout is not None:
+        length = (width - start) if layout.length is None else layout.length
+
+    if (layout is not None) and (1 <= length <= 6) and (start + length <= width):
+        # linear decoders: read the integers, and apply the arithmetic
+        # in the same order (and precision) as the decoder
+        v = np.zeros(n, dtype=np.int64)
+        for i in range(start, start + length):
+            v = (v << 8) | payloads[:, i]
+        if layout.signed:
+            bits = 8 * length
+            v = np.where(v >= (1 << (bits - 1)), v - (1 << bits), v)
+
+        v = v.astype(np.float64)
+        if layout.pre:
+            v = v + layout.pre
+        if layout.mul is not None:
+            v = v * layout.mul
+        if layout.div is not None:
+            v = v / layout.div
+        if layout.post:
+            v = v + layout.post
+        values[valid] = v[valid]
+    else:
+        # anything else goes through the decoder, one row at a time
+        raw = getattr(command.decode, "raw", command.decode)
+        for i in np.flatnonzero(valid):
+            message = Message([])
+            message.data = bytearray(payloads[i].tobytes())
+            value = raw([ message ])
+            if value is None:
+                valid[i] = False
+            else:
+                values[i] = value
+
+    return values, valid
@@ -59,6 +59,11 @@ class ECU:
 
 class Frame(object):
     """ represents a single parsed line of OBD output """
+
+    # avoid a __dict__ per frame, since there are a lot of them
+    __slots__ = ("raw", "data", "priority", "addr_mode", "rx_id", "tx_id",
+                 "type", "seq_index", "data_len")
+
     def __init__(self, raw):
         self.raw       = raw
         self.data      = bytearray()
@@ -73,6 +78,9 @@ class Frame(object):
 
 class Message(object):
     """ represents a fully parsed OBD message of one or more Frames (lines) """
+
+    __slots__ = ("frames", "ecu", "data")
+
     def __init__(self, frames):
         self.frames = frames
         self.ecu    = ECU.UNKNOWN
@@ -130,6 +138,11 @@ class Protocol(object):
     TX_ID_ENGINE = None
     TX_ID_TRANSMISSION = None
 
+    # whether the adapter puts spaces between bytes. Cleared by the
+    # ELM327 class once it has turned them off (ATS0), so that lines
+    # can be parsed without removing them first.
+    spaced = True
+
 
     def __init__(self, lines_0100):
         """
@@ -151,6 +164,10 @@ class Protocol(object):
         # subsequent runs will now be tagged correctly
         self.populate_ecu_map(messages)
 
+        # keep each ECU's answer, which identifies the vehicle
+        # well enough to reuse a saved connection profile
+        self.response_0100 = dict([ (m.tx_id, m.hex()) for m in messages if m.parsed() ])
+
         # log out the ecu map
         for tx_id, ecu in self.ecu_map.items():
             names = [k for k in ECU.__dict__ if ECU.__dict__[k] == ecu ]
@@ -165,6 +182,13 @@ class Protocol(object):
             accepts a list of raw strings from the car, split by lines
         """
 
+        # the most common response is a single frame from a single ECU,
+        # which subclasses may parse without the general machinery below
+        if len(lines) == 1:
+            message = self.parse_single(lines[0])
+            if message is not None:
+                return [ message ]
+
         # ---------------------------- preprocess ----------------------------
 
         # Non-hex (non-OBD) lines shouldn't go through the big parsers,
@@ -173,9 +197,11 @@ class Protocol(object):
         obd_lines = []
         non_obd_lines = []
 
+        spaced = self.spaced
+
         for line in lines:
 
-            line_no_spaces = line.replace(' ', '')
+            line_no_spaces = line.replace(' ', '') if spaced else line
 
             if isHex(line_no_spaces):
                 obd_lines.append(line_no_spaces)
@@ -288,6 +314,19 @@ class Protocol(object):
                     self.ecu_map[m.tx_id] = ECU.UNKNOWN
 
 
+    def parse_single(self, line):
+        """
+            optionally override in subclass for each protocol
+
+            Fast path for responses of a single line. Function recieves
+            the raw string line from the car.
+
+            Function should return the parsed Message, or None if the
+            line needs the general parser (the default).
+        """
+        return None
+
+
     def parse_frame(self, frame):
         """
             override in subclass for each protocol
@@ -31,7 +31,7 @@
 ########################################################################
 
 from binascii import unhexlify
-from obd.utils import contiguous
+from obd.utils import isHex
 from .protocol import Protocol, Message, Frame, ECU
 
 import logging
@@ -56,6 +56,61 @@ class CANProtocol(Protocol):
         Protocol.__init__(self, lines_0100)
 
 
+    def parse_single(self, line):
+        """
+            single frame (SF) responses from one ECU, parsed without
+            sorting or grouping. Anything else goes to the general parser.
+        """
+
+        if self.spaced:
+            line = line.replace(' ', '')
+
+        # a single frame holds 2-8 bytes after the header
+        #        [  ][   Frame (2-8)    ]
+        #        7E8 06 41 00 BE 7F B8 13
+        # 18 DA F1 10 06 41 00 BE 7F B8 13
+        n = len(line) - (3 if self.id_bits == 11 else 8)
+        if (n < 4) or (n > 16) or (n & 1) or not isHex(line):
+            return None
+
+        if self.id_bits == 11:
+            raw_bytes = bytearray(unhexlify("00000" + line))
+
+            # only responses from ECUs (7E8 - 7EF)
+            if (raw_bytes[3] & 0xF8) != 0xE8:
+                return None
+
+            tx_id = raw_bytes[3] & 0x07
+            rx_id = 0xF1
+        else:
+            raw_bytes = bytearray(unhexlify(line))
+            tx_id = raw_bytes[3]
+            rx_id = raw_bytes[2]
+
+        pci = raw_bytes[4]
+        data_len = pci & 0x0F
+
+        # 43 (DTC) responses are trimmed by parse_message()
+        if ((pci & 0xF0) != self.FRAME_TYPE_SF) or (data_len == 0) or (raw_bytes[5] == 0x43):
+            return None
+
+        frame = Frame(line)
+        frame.priority  = raw_bytes[2] & 0x0F if self.id_bits == 11 else raw_bytes[0]
+        frame.addr_mode = raw_bytes[3] & 0xF0 if self.id_bits == 11 else raw_bytes[1]
+        frame.rx_id     = rx_id
+        frame.tx_id     = tx_id
+        frame.type      = self.FRAME_TYPE_SF
+        frame.data_len  = data_len
+
+        del raw_bytes[:4]
+        frame.data = raw_bytes
+
+        message = Message([frame])
+        message.data = raw_bytes[1:1+data_len]
+        message.ecu = self.ecu_map.get(tx_id, ECU.UNKNOWN)
+        return message
+
+
     def parse_frame(self, frame):
 
         raw = frame.raw
@@ -123,7 +178,9 @@ class CANProtocol(Protocol):
         # extract the frame data
         #             [      Frame       ]
         # 00 00 07 E8 06 41 00 BE 7F B8 13
-        frame.data = raw_bytes[4:]
+        # (deleting from the front of a bytearray doesn't copy it)
+        del raw_bytes[:4]
+        frame.data = raw_bytes
 
 
         # read PCI byte (always first byte in the data section)
@@ -185,101 +242,166 @@ class CANProtocol(Protocol):
             message.data = frame.data[1:1+frame.data_len]
 
         else:
-            # sort FF and CF into their own lists
-
-            ff = []
-            cf = []
-
+            reassembler = ISOTPReassembler()
             for f in frames:
-                if f.type == self.FRAME_TYPE_FF:
-                    ff.append(f)
-                elif f.type == self.FRAME_TYPE_CF:
-                    cf.append(f)
-                else:
-                    logger.debug("Dropping frame in multi-frame response not marked as FF or CF")
-
-            # check that we captured only one first-frame
-            if len(ff) > 1:
-                logger.debug("Recieved multiple frames marked FF")
-                return False
-            elif len(ff) == 0:
-                logger.debug("Never received frame marked FF")
-                return False
+                reassembler.feed(f)
 
-            # check that there was at least one consecutive-frame
-            if len(cf) == 0:
-                logger.debug("Never received frame marked CF")
+            data = reassembler.result()
+            if data is None:
                 return False
 
-            # calculate proper sequence indices from the lower 4 bits given
-            for prev, curr in zip(cf, cf[1:]):
-                # Frame sequence numbers only specify the low order bits, so compute the
-                # full sequence number from the frame number and the last sequence number seen:
-                # 1) take the high order bits from the last_sn and low order bits from the frame
-                seq = (prev.seq_index & ~0x0F) + (curr.seq_index)
-                # 2) if this is more than 7 frames away, we probably just wrapped (e.g.,
-                # last=0x0F current=0x01 should mean 0x11, not 0x01)
-                if seq < prev.seq_index - 7:
-                    # untested
-                    seq += 0x10
-
-                curr.seq_index = seq
-
-            # sort the sequence indices
-            cf = sorted(cf, key=lambda f: f.seq_index)
-
-            # check contiguity, and that we aren't missing any frames
-            indices = [f.seq_index for f in cf]
-            if not contiguous(indices, 1, len(cf)):
-                logger.debug("Recieved multiline response with missing frames")
-                return False
+            message.data = data
+
+
+        # trim DTC requests based on DTC count
+        # this ISN'T in the decoder because the legacy protocols
+        # don't provide a DTC_count bytes, and instead, insert a 0x00
+        # for consistency
+
+        if message.data[0] == 0x43:
+            #    []
+            # 43 03 11 11 22 22 33 33
+            #       [DTC] [DTC] [DTC]
 
+            num_dtc_bytes = message.data[1] * 2 # each DTC is 2 bytes
+            message.data = message.data[:(num_dtc_bytes + 2)] # add 2 to account for mode/DTC_count bytes
+
+        return True
+
+
+class ISOTPReassembler(object):
+    """
+        Reassembles one ECU's multi-frame (ISO-TP) message, frame by frame.
+
+        The first frame (FF) declares the message length, which sizes
+        the data buffer up front. Each consecutive frame (CF) is written
+        straight into its place, so frames can be fed as they arrive,
+        in any order. feed() returns True as soon as the declared length
+        has been received, so callers can stop waiting for more frames.
+    """
+
+    FF_DATA_BYTES = 6 # data bytes carried by the first frame
+    CF_DATA_BYTES = 7 # data bytes carried by each consecutive frame
+
+    def __init__(self):
+        self.length   = None  # as declared by the FF
+        self.data     = None
+        self.complete = False
+        self.failed   = False
+        self.__seq       = 0     # full sequence number of the last CF fed
+        self.__received  = set() # full sequence numbers of the CFs placed
+        self.__pending   = []    # CFs that arrived before the FF
+        self.__needed    = 0     # number of CFs needed to complete the message
+        self.__placed    = 0     # CFs placed contiguously from the start
+
+
+    def feed(self, frame):
+        """ adds a parsed FF or CF frame, returns True once the message is complete """
+
+        if self.failed:
+            return False
+
+        if frame.type == CANProtocol.FRAME_TYPE_FF:
+            if self.data is not None:
+                logger.debug("Recieved multiple frames marked FF")
+                self.failed = True
+                return False
 
-            # first frame:
             #             [       Frame         ]
             #             [PCI]                   <-- first frame has a 2 byte PCI
             #              [L ] [     Data      ] L = length of message in bytes
             # 00 00 07 E8 10 13 49 04 01 35 36 30
+            self.length = frame.data_len
+            self.data = bytearray(self.length)
+            first = frame.data[2:2+self.length]
+            self.data[:len(first)] = first
+
+            # always at least one CF, even for lengths that would fit in an SF
+            self.__needed = max(1, -(-(self.length - self.FF_DATA_BYTES) // self.CF_DATA_BYTES))
+
+            pending, self.__pending = self.__pending, []
+            for f in pending:
+                self.__place(f)
+
+        elif frame.type == CANProtocol.FRAME_TYPE_CF:
+            # Frame sequence numbers only specify the low order bits, so compute the
+            # full sequence number from the frame number and the last sequence number seen:
+            # 1) take the high order bits from the last_sn and low order bits from the frame
+            seq = (self.__seq & ~0x0F) + (frame.seq_index & 0x0F)
+            # 2) if this is more than 7 frames away, we probably just wrapped (e.g.,
+            # last=0x0F current=0x01 should mean 0x11, not 0x01)
+            if seq < self.__seq - 7:
+                seq += 0x10
+
+            self.__seq = seq
+            frame.seq_index = seq
+
+            if self.data is None:
+                self.__pending.append(frame)
+            else:
+                self.__place(frame)
+
+        else:
+            logger.debug("Dropping frame in multi-frame response not marked as FF or CF")
 
+        return self.complete
 
-            # consecutive frame:
-            #             [       Frame         ]
-            #             []                       <-- consecutive frames have a 1 byte PCI
-            #              N [       Data       ]  N = current frame number (rolls over to 0 after F)
-            # 00 00 07 E8 21 32 38 39 34 39 41 43
-            # 00 00 07 E8 22 00 00 00 00 00 00 31
 
+    def __place(self, frame):
+        """ copies a CF's data into the buffer """
 
-            # original data:
-            # [     specified message length (from first-frame)      ]
-            # 49 04 01 35 36 30 32 38 39 34 39 41 43 00 00 00 00 00 00 31
+        seq = frame.seq_index
+        if (seq < 1) or (seq in self.__received):
+            logger.debug("Recieved multiline response with bad sequence indices")
+            self.failed = True
+            return
 
+        self.__received.add(seq)
 
-            # on the first frame, skip PCI byte AND length code
-            message.data = ff[0].data[2:]
+        # consecutive frame:
+        #             [       Frame         ]
+        #             []                       <-- consecutive frames have a 1 byte PCI
+        #              N [       Data       ]  N = current frame number (rolls over to 0 after F)
+        # 00 00 07 E8 21 32 38 39 34 39 41 43
+        offset = self.FF_DATA_BYTES + (seq - 1) * self.CF_DATA_BYTES
+        if offset < self.length:
+            chunk = frame.data[1:1+self.length-offset]
+            self.data[offset:offset+len(chunk)] = chunk
 
-            # now that they're in order, load/accumulate the data from each CF frame
-            for f in cf:
-                message.data += f.data[1:] # chop off the PCI byte
+        while (self.__placed + 1) in self.__received:
+            self.__placed += 1
 
-            # chop to the correct size (as specified in the first frame)
-            message.data = message.data[:ff[0].data_len]
+        self.complete = (self.__placed >= self.__needed)
 
 
-        # trim DTC requests based on DTC count
-        # this ISN'T in the decoder because the legacy protocols
-        # don't provide a DTC_count bytes, and instead, insert a 0x00
-        # for consistency
+    def result(self):
+        """
+            returns the message data once every frame has been fed,
+            or None if the frames don't form a message. As before,
+            a message whose last frames are missing is cut short.
+        """
 
-        if message.data[0] == 0x43:
-            #    []
-            # 43 03 11 11 22 22 33 33
-            #       [DTC] [DTC] [DTC]
+        if self.failed:
+            return None
 
-            num_dtc_bytes = message.data[1] * 2 # each DTC is 2 bytes
-            message.data = message.data[:(num_dtc_bytes + 2)] # add 2 to account for mode/DTC_count bytes
+        if self.data is None:
+            logger.debug("Never received frame marked FF")
+            return None
+
+        if not self.__received:
+            logger.debug("Never received frame marked CF")
+            return None
+
+        # check that we aren't missing any frames
+        if self.__placed != len(self.__received):
+            logger.debug("Recieved multiline response with missing frames")
+            return None
+
+        end = self.FF_DATA_BYTES + self.__placed * self.CF_DATA_BYTES
+        if end < self.length:
+            del self.data[end:]
+        return self.data
 
-        return True
 
 
 ##############################################
@@ -31,7 +31,7 @@
 ########################################################################
 
 from binascii import unhexlify
-from obd.utils import contiguous
+from obd.utils import contiguous, isHex
 from .protocol import Protocol, Message, Frame, ECU
 
 import logging
@@ -48,6 +48,41 @@ class LegacyProtocol(Protocol):
         Protocol.__init__(self, lines_0100)
 
 
+    def parse_single(self, line):
+        """
+            single frame responses from one ECU, parsed without
+            sorting or grouping. Anything else goes to the general parser.
+        """
+
+        if self.spaced:
+            line = line.replace(' ', '')
+
+        # [Header] [    Frame (2-7)    ]
+        # 48 6B 10 41 00 BE 7F B8 13 ck
+        if (len(line) < 12) or (len(line) > 22) or (len(line) & 1) or not isHex(line):
+            return None
+
+        raw_bytes = bytearray(unhexlify(line))
+
+        # 43 (DTC) responses are reformatted by parse_message()
+        if raw_bytes[3] == 0x43:
+            return None
+
+        frame = Frame(line)
+        frame.priority = raw_bytes[0]
+        frame.rx_id    = raw_bytes[1]
+        frame.tx_id    = raw_bytes[2]
+
+        del raw_bytes[-1]
+        del raw_bytes[:3]
+        frame.data = raw_bytes
+
+        message = Message([frame])
+        message.data = raw_bytes
+        message.ecu = self.ecu_map.get(frame.tx_id, ECU.UNKNOWN)
+        return message
+
+
     def parse_frame(self, frame):
 
         raw = frame.raw
@@ -72,14 +107,17 @@ class LegacyProtocol(Protocol):
         # 48 6B 10 41 00 BE 7F B8 13 ck
         # ck = checksum byte
 
-        # exclude header and trailing checksum (handled by ELM adapter)
-        frame.data = raw_bytes[3:-1]
-
         # read header information
         frame.priority = raw_bytes[0]
         frame.rx_id    = raw_bytes[1]
         frame.tx_id    = raw_bytes[2]
 
+        # exclude header and trailing checksum (handled by ELM adapter)
+        # (trimming the bytearray in place doesn't copy it)
+        del raw_bytes[-1]
+        del raw_bytes[:3]
+        frame.data = raw_bytes
+
         return True
 
 
@@ -30,12 +30,20 @@
 #                                                                      #
 ########################################################################
 
-import serial
 import errno
+import binascii
 import string
 import glob
 import sys
+import time
+import threading
 import logging
+from collections import OrderedDict
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue # python 2
 
 logger = logging.getLogger(__name__)
 
@@ -53,53 +61,99 @@ class OBDStatus:
 
 class bitarray:
     """
-    Class for representing bitarrays (inefficiently)
+    Class for representing bitarrays, stored as a single int
 
-    There's a nice C-optimized lib for this: https://github.com/ilanschnell/bitarray
-    but python-OBD doesn't use it enough to be worth adding the dependency.
-    But, if this class starts getting used too much, we should switch to that lib.
+    Bits are indexed from the most significant bit of the first byte.
+    Indices outside the array read as False.
     """
 
     def __init__(self, _bytearray):
-        self.bits = ""
-        for b in _bytearray:
-            v = bin(b)[2:]
-            self.bits += ("0" * (8 - len(v))) + v # pad it with zeros
+        _bytearray = bytearray(_bytearray)
+        self.__length = len(_bytearray) * 8
+        self.__value = int(binascii.hexlify(_bytearray), 16) if _bytearray else 0
 
     def __getitem__(self, key):
         if isinstance(key, int):
-            if key >= 0 and key < len(self.bits):
-                return self.bits[key] == "1"
+            if key >= 0 and key < self.__length:
+                return ((self.__value >> (self.__length - 1 - key)) & 1) == 1
             else:
                 return False
         elif isinstance(key, slice):
-            bits = self.bits[key]
-            if bits:
-                return [ b == "1" for b in bits ]
-            else:
-                return []
+            value = self.__value
+            last = self.__length - 1
+            return [ ((value >> (last - i)) & 1) == 1 for i in range(*key.indices(self.__length)) ]
+
+    @property
+    def bits(self):
+        """ the bits as a string of '0's and '1's """
+        if self.__length:
+            return format(self.__value, "0%db" % self.__length)
+        else:
+            return ""
 
     def num_set(self):
-        return self.bits.count("1")
+        return bin(self.__value).count("1")
 
     def num_cleared(self):
-        return self.bits.count("0")
+        return self.__length - self.num_set()
 
     def value(self, start, stop):
-        bits = self.bits[start:stop]
-        if bits:
-            return int(bits, 2)
-        else:
+        start, stop, _ = slice(start, stop).indices(self.__length)
+        if stop <= start:
             return 0
+        return (self.__value >> (self.__length - stop)) & ((1 << (stop - start)) - 1)
 
     def __len__(self):
-        return len(self.bits)
+        return self.__length
 
     def __str__(self):
         return self.bits
 
     def __iter__(self):
-        return [ b == "1" for b in self.bits ].__iter__()
+        value = self.__value
+        for i in range(self.__length - 1, -1, -1):
+            yield ((value >> i) & 1) == 1
+
+
+class LRUCache:
+    """ dict-like cache, which forgets the least recently used keys beyond maxsize """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.__data = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.__lock:
+            try:
+                value = self.__data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self.__data[key] = value # most recent last
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self.__lock:
+            self.__data.pop(key, None)
+            self.__data[key] = value
+            while len(self.__data) > self.maxsize:
+                self.__data.popitem(last=False)
+
+    def clear(self):
+        with self.__lock:
+            self.__data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __contains__(self, key):
+        return key in self.__data
+
+    def __len__(self):
+        return len(self.__data)
 
 
 def bytes_to_int(bs):
@@ -124,8 +178,10 @@ def twos_comp(val, num_bits):
         val = val - (1<<num_bits)
     return val
 
+HEX_DIGITS = frozenset(string.hexdigits)
+
 def isHex(_hex):
-    return all([c in string.hexdigits for c in _hex])
+    return HEX_DIGITS.issuperset(_hex)
 
 def contiguous(l, start, end):
     """ checks that a list of integers are consequtive """
@@ -144,8 +200,69 @@ def contiguous(l, start, end):
     return True
 
 
+def run_parallel(func, items, timeout, first=False, workers=16):
+    """
+        Calls func(item) for each item on a small pool of daemon threads.
+
+        Returns a list of (item, result) pairs for the calls that returned
+        a truthy result before the timeout, in the order they finished.
+        With first=True, returns as soon as one call succeeds. Calls that
+        are still running at that point are left to finish in the background.
+    """
+
+    jobs = queue.Queue()
+    results = queue.Queue()
+
+    for item in items:
+        jobs.put(item)
+
+    def worker():
+        while True:
+            try:
+                item = jobs.get_nowait()
+            except queue.Empty:
+                return
+
+            try:
+                result = func(item)
+            except Exception as e:
+                logger.debug("%s failed for %s: %s" % (func.__name__, str(item), str(e)))
+                result = None
+
+            results.put((item, result))
+
+    for i in range(min(len(items), workers)):
+        t = threading.Thread(target=worker)
+        t.daemon = True
+        t.start()
+
+    deadline = time.time() + timeout
+    found = []
+
+    for i in range(len(items)):
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            logger.debug("Gave up waiting on %d calls to %s" % (len(items) - i, func.__name__))
+            break
+
+        try:
+            item, result = results.get(timeout=remaining)
+        except queue.Empty:
+            logger.debug("Gave up waiting on %d calls to %s" % (len(items) - i, func.__name__))
+            break
+
+        if result:
+            found.append((item, result))
+            if first:
+                break
+
+    return found
+
+
 def try_port(portStr):
     """returns boolean for port availability"""
+    import serial # only loaded when ports are used
+
     try:
         s = serial.Serial(portStr)
         s.close() # explicit close 'cause of delayed GC in java
@@ -160,9 +277,8 @@ def try_port(portStr):
     return False
 
 
-def scan_serial():
+def scan_serial(timeout=5):
     """scan for available ports. return a list of serial names"""
-    available = []
 
     possible_ports = []
 
@@ -182,8 +298,6 @@ def scan_serial():
 
     # possible_ports += glob.glob('/dev/pts/[0-9]*') # for obdsim
 
-    for port in possible_ports:
-        if try_port(port):
-            available.append(port)
-
-    return available
+    # open the ports in parallel, but keep their original order
+    available = [ port for port, ok in run_parallel(try_port, possible_ports, timeout) ]
+    return [ port for port in possible_ports if port in available ]
@@ -24,6 +24,10 @@ setup(
     license="GNU GPLv2",
     packages=find_packages(),
     include_package_data=True,
+    package_data={"obd": ["data/*.tsv"]},
     zip_safe=False,
     install_requires=["pyserial==3.*", "pint==0.7.*"],
+    extras_require={
+        "batch": ["numpy"],
+    },
 )
@@ -4,3 +4,5 @@ import pytest
 def pytest_addoption(parser):
     parser.addoption("--port", action="store", default=None,
                      help="device file for doing end-to-end testing")
+    parser.addoption("--benchmark", action="store_true", default=False,
+                     help="also run the timing checks, which need an otherwise idle machine")
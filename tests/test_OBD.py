@@ -10,6 +10,7 @@ from obd.protocols.protocol import Message
 from obd.utils import OBDStatus
 from obd.OBDCommand import OBDCommand
 from obd.decoders import noop
+from obd.UnitsAndScaling import is_quantity
 
 
 
@@ -22,6 +23,7 @@ class FakeELM:
         self._portname = portname
         self._status = OBDStatus.CAR_CONNECTED
         self._last_command = None
+        self._target = ECU.ALL
 
     def port_name(self):
         return self._portname
@@ -41,6 +43,12 @@ class FakeELM:
     def close(self):
         pass
 
+    def set_target(self, ecu):
+        self._target = ecu
+
+    def target(self):
+        return self._target
+
     def send_and_parse(self, cmd):
         # stow this, so we can check that the API made the right request
         print(cmd)
@@ -185,3 +193,226 @@ def test_fast():
     assert command.fast
     o.query(command, force=True) # force since this command isn't in the tables
     # assert o.interface._test_last_command(command.command)
+
+
+
+def test_query_many():
+    o = obd.OBD("/dev/null", fast=False)
+    o.interface = FakeELM("/dev/null")
+
+    # answer with all three PIDs, out of order, in one message
+    def send_and_parse(cmd):
+        o.interface._last_command = cmd
+        message = Message([])
+        message.data = bytearray([0x41, 0x0D, 0x3C, 0x0C, 0x1A, 0xF8, 0x05, 0x7B])
+        message.ecu = ECU.ENGINE
+        return [ message ]
+
+    o.interface.send_and_parse = send_and_parse
+
+    cmds = [obd.commands.RPM, obd.commands.SPEED, obd.commands.COOLANT_TEMP]
+    r = o.query_many(cmds, force=True)
+    assert o.interface._test_last_command(b"010C0D05")
+
+    assert len(r) == 3
+    assert r[0].value == Unit.Quantity(1726, Unit.rpm)
+    assert r[1].value == Unit.Quantity(60, Unit.kph)
+    assert r[2].value == Unit.Quantity(83, Unit.celsius)
+
+    # commands that can't be packed are sent on their own
+    r = o.query_many([obd.commands.RPM, obd.commands.GET_DTC], force=True)
+    assert len(r) == 2
+    assert o.interface._test_last_command(obd.commands.GET_DTC.command)
+
+    # legacy protocols don't support multi-PID requests
+    o.interface.protocol_id = lambda: "1"
+    r = o.query_many(cmds, force=True)
+    assert o.interface._test_last_command(obd.commands.COOLANT_TEMP.command)
+
+
+
+def test_units():
+    o = obd.OBD("/dev/null", units=False)
+    o.interface = FakeELM("/dev/null")
+
+    def send_and_parse(cmd):
+        message = Message([])
+        message.data = bytearray([0x41, 0x0C, 0x1A, 0xF8])
+        message.ecu = ECU.ENGINE
+        return [ message ]
+
+    o.interface.send_and_parse = send_and_parse
+
+    r = o.query(obd.commands.RPM, force=True)
+    assert r.value == 1726
+    assert not isinstance(r.value, Unit.Quantity)
+    assert r.unit == "rpm"
+
+    o.units = True
+    r = o.query(obd.commands.RPM, force=True)
+    assert r.value == Unit.Quantity(1726, Unit.rpm)
+
+
+
+def test_target():
+    o = obd.OBD("/dev/null")
+    o.interface = FakeELM("/dev/null")
+
+    # engine-only commands are addressed to the engine
+    o.query(obd.commands.RPM, force=True)
+    assert o.interface._target == ECU.ENGINE
+
+    o.query(obd.commands.GET_DTC, force=True)
+    assert o.interface._target == ECU.ALL
+
+    # groups are only addressed when all commands agree
+    o.query_many([obd.commands.RPM, obd.commands.SPEED], force=True)
+    assert o.interface._target == ECU.ENGINE
+    any_speed = OBDCommand("ANY_SPEED", "Speed from any ECU", b"010D", 1, noop, ECU.ALL, True)
+    o.query_many([any_speed, obd.commands.RPM], force=True)
+    assert o.interface._target == ECU.ALL
+
+    # fast mode off sends unaltered, functional requests
+    o.fast = False
+    o.query(obd.commands.RPM, force=True)
+    assert o.interface._target == ECU.ALL
+
+
+
+def test_target_batches():
+    """ commands for alternating targets only switch the addressing once per target """
+    o = obd.OBD("/dev/null")
+    o.interface = FakeELM("/dev/null")
+
+    sent = [] # (target, command string) of each request
+    switches = []
+    def set_target(ecu):
+        if ecu != o.interface._target:
+            switches.append(ecu)
+        o.interface._target = ecu
+    send_and_parse = o.interface.send_and_parse
+    def send(cmd):
+        sent.append((o.interface._target, cmd))
+        return send_and_parse(cmd)
+    o.interface.set_target = set_target
+    o.interface.send_and_parse = send
+
+    c = obd.commands
+    cmds = [c.RPM, c.GET_DTC, c.SPEED, c.MONITOR_O2_B1S1, c.COOLANT_TEMP, c.CLEAR_DTC]
+    responses = o.query_many(cmds, force=True)
+    assert len(responses) == len(cmds)
+    # functional requests first, since that's the adapter's current addressing
+    assert switches == [ECU.ENGINE]
+    assert [ target for target, cmd in sent ] == [ECU.ALL, ECU.ALL, ECU.ALL, ECU.ENGINE]
+    assert sent[-1][1] == b"010C0D05"
+
+    # each batch starts with the current target
+    del switches[:]
+    o.query_many(cmds, force=True)
+    assert switches == [ECU.ALL]
+    o.query_many(cmds, force=True)
+    assert switches == [ECU.ALL, ECU.ENGINE]
+
+
+def test_frame_counts_per_target():
+    """ frame counts learned while addressing one ECU aren't used for functional requests """
+    o = obd.OBD("/dev/null")
+    o.interface = FakeELM("/dev/null")
+
+    o.query(obd.commands.RPM, force=True)
+    assert o.interface._test_last_command(b"010C")
+    o.query(obd.commands.GET_DTC, force=True)
+    o.query(obd.commands.RPM, force=True)
+    assert o.interface._test_last_command(b"010C0")
+
+    # the adapter rejected ATSH/ATCRA, and fell back to functional requests
+    o.interface.set_target = lambda ecu: None
+    o.interface._target = None
+    o.query(obd.commands.GET_DTC, force=True)
+    o.query(obd.commands.RPM, force=True)
+    assert o.interface._test_last_command(b"010C")
+    o.query(obd.commands.GET_DTC, force=True)
+    o.query(obd.commands.RPM, force=True)
+    assert o.interface._test_last_command(b"010C0")
+
+
+def test_monitor():
+    o = obd.OBD("/dev/null")
+    o.interface = FakeELM("/dev/null")
+
+    lines = ["18FEF100FFFF0012FFFFFFFF", "SEARCHING...", "18F00400F07D7D001AFFFFFF"]
+    requested = []
+    def monitor(pgn=None):
+        requested.append(pgn)
+        for line in lines:
+            yield line
+
+    o.interface.monitor = monitor
+
+    # only for J1939
+    assert list(o.monitor()) == []
+    assert requested == []
+
+    o.interface.protocol_id = lambda: "A"
+
+    messages = list(o.monitor())
+    assert requested == [None]
+    assert [ m.pgn for m in messages ] == [0xFEF1, 0xF004]
+    assert messages[1].values["ENGINE_SPEED"] == Unit.Quantity(832, Unit.rpm)
+
+    # a single PGN is filtered by the adapter
+    assert [ m.pgn for m in o.monitor([0xF004]) ] == [0xF004]
+    assert requested[-1] == 0xF004
+
+    # several are filtered here
+    assert [ m.pgn for m in o.monitor([0xF004, 0xFEEE]) ] == [0xF004]
+    assert requested[-1] is None
+
+    # plain numbers with units off
+    o.units = False
+    messages = list(o.monitor())
+    assert messages[1].values["ENGINE_SPEED"] == 832
+    assert not any(is_quantity(v) for m in messages for v in m.values.values())
+
+
+
+def test_profile(tmpdir, monkeypatch):
+    connections = [] # (baudrate, protocol) of each ELM327 that was created
+
+    class ProfiledELM(FakeELM):
+        def __init__(self, portname, baudrate=None, protocol=None, *args):
+            FakeELM.__init__(self, portname)
+            connections.append((baudrate, protocol))
+
+        def boot_baudrate(self):
+            return 38400
+
+        def fingerprint(self):
+            return { "2024" : { "ecu" : ECU.ENGINE, "0100" : "4100be3eb811" } }
+
+    monkeypatch.setattr(obd.obd, "ELM327", ProfiledELM)
+    path = str(tmpdir.join("profiles.json"))
+
+    # the first connection runs a full discovery
+    o = obd.OBD("/dev/ttyUSB0", profile=path)
+    assert connections == [(None, None)]
+    o.query(obd.commands.RPM, force=True)
+    supported = set(o.supported_commands)
+    o.close()
+
+    # the next one resumes from the profile, without querying the PID getters
+    o = obd.OBD("/dev/ttyUSB0", profile=path)
+    assert connections[-1] == (38400, "6")
+    assert o.interface._test_last_command(None)
+    assert o.supported_commands == supported
+
+    # learned frame counts are kept
+    o.query(obd.commands.RPM, force=True)
+    assert o.interface._test_last_command(obd.commands.RPM.command + b"0")
+    o.close()
+
+    # a different car falls back to a full discovery
+    ProfiledELM.fingerprint = lambda self: {}
+    del connections[:]
+    o = obd.OBD("/dev/ttyUSB0", profile=path)
+    assert connections == [(38400, "6"), (None, None)]
@@ -1,8 +1,9 @@
 
 from obd.OBDCommand import OBDCommand
 from obd.UnitsAndScaling import Unit
-from obd.decoders import noop
+from obd.decoders import noop, uas, temp
 from obd.protocols import *
+from obd.commands import commands
 
 
 
@@ -67,6 +68,114 @@ def test_call():
 
 
 
+def test_call_units():
+    p = SAE_J1850_PWM(["48 6B 10 41 00 FF FF FF FF AA"])
+    messages = p(["48 6B 10 41 05 7B 00 00 00 AA"])
+
+    cmd = OBDCommand("", "", b"0105", 3, temp, ECU.ENGINE)
+    assert cmd.unit == "celsius"
+
+    r = cmd(messages)
+    assert r.value == Unit.Quantity(83, Unit.celsius)
+
+    # plain numbers carry the unit on the command
+    r = cmd(messages, units=False)
+    assert r.value == 83
+    assert r.unit == "celsius"
+
+    # decoders without units are unaffected
+    cmd = OBDCommand("", "", b"0105", 3, noop, ECU.ENGINE)
+    assert cmd.unit is None
+    assert cmd(messages, units=False).value == bytearray([0x41, 0x05, 0x7B])
+
+
+def test_cache():
+    p = SAE_J1850_PWM(["48 6B 10 41 00 FF FF FF FF AA"])
+    cmd = OBDCommand("", "", b"0105", 3, temp, ECU.ENGINE)
+    assert cmd.cache_size == 0
+    assert cmd.cache_stats() == {}
+
+    cmd.set_cache(2)
+    a = cmd(p(["48 6B 10 41 05 7B 00 00 00 AA"]))
+    b = cmd(p(["48 6B 10 41 05 7B 00 00 00 AA"]))
+    assert a.value == b.value == Unit.Quantity(83, Unit.celsius)
+
+    # the plain number is cached, so it serves both unit modes
+    assert cmd(p(["48 6B 10 41 05 7B 00 00 00 AA"]), units=False).value == 83
+
+    # a different payload
+    assert cmd(p(["48 6B 10 41 05 7C 00 00 00 AA"])).value == Unit.Quantity(84, Unit.celsius)
+
+    stats = cmd.cache_stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 2
+    assert stats["hit_rate"] == 0.5
+    assert stats["size"] == stats["maxsize"] == 2
+
+    assert cmd.clone().cache_size == 2
+    cmd.set_cache(0)
+    assert cmd.cache_stats() == {}
+
+
+def test_cache_values_not_shared():
+    """ changing a returned value doesn't leak into the next hit """
+    p = SAE_J1850_PWM(["48 6B 10 41 00 FF FF FF FF AA"])
+
+    def twice(cmd, line, protocol=p):
+        lines = line if isinstance(line, list) else [line]
+        cmd = cmd.clone()
+        cmd.set_cache(4)
+        first = cmd(protocol(lines)).value
+        second = lambda: cmd(protocol(lines)).value
+        return first, second
+
+    # Quantities
+    first, second = twice(OBDCommand("", "", b"0105", 3, temp, ECU.ALL), "48 6B 10 41 05 7B 00 00 00 AA")
+    first.ito(Unit.kelvin)
+    assert second() == Unit.Quantity(83, Unit.celsius)
+    assert str(second().u) == "degree_Celsius"
+
+    # lists
+    first, second = twice(commands.GET_DTC, "48 6B 10 43 01 04 80 03 00 00 AA")
+    assert first == [("P0104", "Mass or Volume Air Flow Circuit Intermittent"), ("B0003", "")]
+    first.append(("P0001", ""))
+    first[0] = None
+    assert second() == [("P0104", "Mass or Volume Air Flow Circuit Intermittent"), ("B0003", "")]
+
+    # Status
+    first, second = twice(commands.STATUS, "48 6B 10 41 01 83 07 FF 00 AA")
+    first.MIL = False
+    first.MISFIRE_MONITORING.available = False
+    assert second().MIL
+    assert second().MISFIRE_MONITORING.available
+    assert second() is not second()
+
+    # Monitor
+    can = ISO_15765_4_11bit_500k(["7E8 06 41 00 FF FF FF FF"])
+    first, second = twice(commands.MONITOR_O2_B1S1, ["7E8 10 0A 46 01 01 0A 0B B0",
+                                                     "7E8 21 0B B0 0B B0 00 00 00"], can)
+    first[0x01].value = None
+    assert not second()[0x01].is_null()
+    assert second()[0x01] is not second()[0x01]
+
+
+def test_units_false_monitor():
+    """ mode 06 monitors decode to plain numbers when units are off """
+    from obd.UnitsAndScaling import is_quantity
+    can = ISO_15765_4_11bit_500k(["7E8 06 41 00 FF FF FF FF"])
+    lines = ["7E8 10 0A 46 01 01 0A 0B B0", "7E8 21 0B B0 0B B0 00 00 00"]
+
+    cmd = commands.MONITOR_O2_B1S1.clone()
+    for cache in (0, 4, 4): # uncached, then a cache miss and a hit
+        cmd.set_cache(cache)
+        test = cmd(can(lines), units=False).value[0x01]
+        assert not test.is_null()
+        for value in (test.value, test.min, test.max):
+            assert not is_quantity(value)
+            assert value == 365.024
+        assert is_quantity(cmd(can(lines)).value[0x01].value)
+
+
 def test_get_mode():
     cmd = OBDCommand("", "", b"0123", 4, noop, ECU.ENGINE)
     assert cmd.mode == 0x01
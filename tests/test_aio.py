@@ -0,0 +1,140 @@
+
+import os
+import pty
+import tty
+import asyncio
+import threading
+import pytest
+
+aio = pytest.importorskip("obd.aio")
+
+import obd
+from obd import Unit
+from obd.protocols import ISO_15765_4_11bit_500k
+from obd.utils import OBDStatus
+
+
+
+class FakeELM:
+    """
+        Fake ELM327 driver class, whose serial port is one side of a pty
+    """
+
+    def __init__(self, fd):
+        self._fd = fd
+        self._protocol = ISO_15765_4_11bit_500k(["7E8 06 41 00 FF FF FF FF"])
+
+    def status(self):
+        return OBDStatus.CAR_CONNECTED
+
+    def protocol_id(self):
+        return "6"
+
+    def fileno(self):
+        return self._fd
+
+    def parse(self, lines):
+        return self._protocol(lines)
+
+    def close(self):
+        pass
+
+
+def respond(master, responses):
+    """ answers each command written to the pty with the next response """
+    requests = []
+
+    def run():
+        for response in responses:
+            request = b""
+            while not request.endswith(b"\r\n"):
+                request += os.read(master, 1024)
+            requests.append(request)
+            os.write(master, response)
+
+    t = threading.Thread(target=run)
+    t.daemon = True
+    t.start()
+    return requests
+
+
+@pytest.fixture
+def port():
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+    yield master, slave
+    os.close(master)
+    os.close(slave)
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+
+def test_transport(port):
+    master, slave = port
+    requests = respond(master, [b"7E8 04 41 0C 1A F8\r\r>"])
+
+    transport = aio.ELMTransport(slave)
+    lines = run(transport.send(b"010C"))
+
+    assert requests == [b"010C\r\n"]
+    assert lines == ["7E8 04 41 0C 1A F8"]
+
+
+def test_query(port):
+    master, slave = port
+    requests = respond(master, [
+        b"7E8 04 41 0C 1A F8\r\r>",
+        b"7E8 03 41 0D 3C\r\r>",
+        b"7E8 04 41 0C 1A F8\r\r>",
+    ])
+
+    o = aio.AsyncIOOBD("/dev/null")
+    o.interface = FakeELM(slave)
+
+    # not supported, and not forced
+    r = run(o.query(obd.commands.SPEED))
+    assert r.is_null()
+
+    r = run(o.query(obd.commands.RPM, force=True))
+    assert r.value == Unit.Quantity(1726, Unit.rpm)
+
+    r = run(o.query(obd.commands.SPEED, force=True))
+    assert r.value == Unit.Quantity(60, Unit.kph)
+
+    # learned frame count is appended, rather than sending a lone CR
+    o.supported_commands.add(obd.commands.RPM)
+    r = run(o.query(obd.commands.RPM))
+    assert r.value == Unit.Quantity(1726, Unit.rpm)
+
+    assert requests == [b"010C\r\n", b"010D\r\n", b"010C1\r\n"]
+
+
+def test_stream(port):
+    master, slave = port
+    respond(master, [
+        b"7E8 04 41 0C 1A F8\r\r>",
+        b"7E8 03 41 0D 3C\r\r>",
+        b"7E8 04 41 0C 1A F8\r\r>",
+    ])
+
+    o = aio.AsyncIOOBD("/dev/null")
+    o.interface = FakeELM(slave)
+
+    async def collect():
+        rs = []
+        async for r in o.stream([obd.commands.RPM, obd.commands.SPEED], force=True):
+            rs.append(r)
+            if len(rs) == 3:
+                break
+        return rs
+
+    rs = run(collect())
+    assert [r.command for r in rs] == [obd.commands.RPM, obd.commands.SPEED, obd.commands.RPM]
+    assert rs[1].value == Unit.Quantity(60, Unit.kph)
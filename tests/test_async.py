@@ -0,0 +1,137 @@
+
+"""
+    Tests for the Async update loop's scheduling
+"""
+
+import pytest
+
+import obd
+import obd.asynchronous
+from obd.OBDResponse import OBDResponse
+
+
+class FakeClock:
+    """ stands in for the time module, so that the loop runs instantly """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def loop(monkeypatch):
+    """
+        returns run(connection, duration, round_trip), which drives the
+        update loop with a stubbed query_many(), and returns a list of
+        (time, [command names]) for each request that was sent. The
+        deadlines at the time of each request are kept in run.deadlines
+    """
+    clock = FakeClock()
+    monkeypatch.setattr(obd.asynchronous, "time", clock)
+
+    def run(connection, duration, round_trip=0.01):
+        sent = []
+        run.deadlines = []
+
+        def query_many(self, cmds, force=False):
+            sent.append((clock.now, [ c.name for c in cmds ]))
+            run.deadlines.append(dict([ (c.name, d) for c, d in connection._Async__deadlines.items() ]))
+            clock.now += round_trip
+            if clock.now >= duration:
+                connection._Async__running = False
+            return [ OBDResponse(c, []) for c in cmds ]
+
+        monkeypatch.setattr(obd.OBD, "query_many", query_many)
+        connection._Async__running = True
+        connection.run()
+        return sent
+
+    return run
+
+
+def times(sent, name):
+    return [ t for t, names in sent if name in names ]
+
+
+def sent_early(sent, deadlines):
+    """ the commands that were sent before their deadline """
+    return [ (t, n) for (t, names), d in zip(sent, deadlines) for n in names if d.get(n, 0) > t ]
+
+
+def test_periods_respected(loop):
+    o = obd.Async("/dev/null")
+    o.watch(obd.commands.RPM, force=True, period=0.5)
+    o.watch(obd.commands.COOLANT_TEMP, force=True, period=5)
+
+    sent = loop(o, 20)
+
+    rpm = times(sent, "RPM")
+    temp = times(sent, "COOLANT_TEMP")
+    assert 39 <= len(rpm) <= 41
+    assert 4 <= len(temp) <= 5
+
+    # never sent before they're due
+    assert sent_early(sent, loop.deadlines) == []
+    assert o.missed_deadlines() == { obd.commands.RPM : 0, obd.commands.COOLANT_TEMP : 0 }
+
+
+def test_single_slow_command(loop):
+    o = obd.Async("/dev/null")
+    o.watch(obd.commands.COOLANT_TEMP, force=True, period=5)
+
+    sent = loop(o, 20)
+
+    # one request per period, sent as soon as it's due (give or take one sleep)
+    temp = times(sent, "COOLANT_TEMP")
+    assert len(temp) == len(sent) == 5
+    for t, due in zip(temp, [0, 5, 10, 15, 20]):
+        assert due <= t <= due + 0.25
+
+
+def test_spare_slots(loop):
+    o = obd.Async("/dev/null")
+    o.watch(obd.commands.RPM, force=True) # as fast as possible
+    o.watch(obd.commands.COOLANT_TEMP, force=True, period=1)
+
+    sent = loop(o, 10, round_trip=0.1)
+
+    # every spare slot goes to the command without a period
+    assert len(times(sent, "RPM")) == len(sent)
+    assert any(names == ["RPM"] for t, names in sent)
+    temp = times(sent, "COOLANT_TEMP")
+    assert 10 <= len(temp) <= 11
+    assert sent_early(sent, loop.deadlines) == []
+
+
+def test_edf_order(loop):
+    o = obd.Async("/dev/null")
+    o.watch(obd.commands.SPEED, force=True, period=3)
+    o.watch(obd.commands.RPM, force=True, period=1)
+    o.watch(obd.commands.COOLANT_TEMP, force=True, period=2)
+
+    # a slow round trip leaves several commands due at once
+    sent = loop(o, 30, round_trip=1.5)
+    assert any(len(names) > 1 for t, names in sent[1:])
+
+    # each request only holds due commands, earliest deadline first
+    assert sent_early(sent, loop.deadlines) == []
+    for (t, names), deadlines in zip(sent[1:], loop.deadlines[1:]):
+        assert [ deadlines[n] for n in names ] == sorted([ deadlines[n] for n in names ])
+
+
+def test_missed_deadlines(loop):
+    o = obd.Async("/dev/null")
+    o.watch(obd.commands.RPM, force=True, period=0.5)
+    o.watch(obd.commands.COOLANT_TEMP, force=True, period=5)
+
+    # every request takes longer than RPM's period
+    loop(o, 10, round_trip=1.2)
+
+    missed = o.missed_deadlines()
+    assert missed[obd.commands.RPM] > 0
+    assert missed[obd.commands.COOLANT_TEMP] == 0
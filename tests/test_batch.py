@@ -0,0 +1,179 @@
+import pytest
+import obd
+from obd.protocols import *
+from obd.protocols.protocol import Message
+from obd.utils import isHex
+
+np = pytest.importorskip("numpy")
+from obd.protocols.batch import parse_frames, parse_messages, payload_rows
+
+
+# responses as returned by the adapter (one list of lines per command)
+RESPONSES_11 = [
+    ["7E8 06 41 00 BE 3F B8 13"],                 # SF
+    ["7E8 06 41 00 BE 3F B8 13", "7E9 06 41 00 98 18 80 10"], # two ECUs
+    ["7E8 01 41"],                                # shortest
+    ["7E8 07 41 00 00 01 02 03 04"],              # longest
+    ["7E8 03 41 0C 1A 00 00 00 00"],              # padded
+    ["7E8 01"],                                   # too short
+    ["7E8 08 41 00 00 01 02 03 04 05"],           # too long
+    ["7E8 00"],                                   # empty
+    ["7E8 08 41 00 00 01 02 03 04 0"],            # odd size
+    ["NO DATA"],
+    ["7E8 04 43 01 01 33 00 00 00"],              # DTC, trimmed by count
+    ["7E8 10 14 49 02 01 31 44 34",               # multi-frame VIN
+     "7E8 21 47 50 30 30 52 35 35",
+     "7E8 22 42 31 32 33 34 35 36"],
+    ["7E8 10 14 49 02 01 31 44 34",               # interleaved ECUs
+     "7E9 06 41 00 98 18 80 10",
+     "7E8 21 47 50 30 30 52 35 35",
+     "7E8 22 42 31 32 33 34 35 36"],
+    ["7E8 10 14 49 02 01 31 44 34",               # missing frame
+     "7E8 22 42 31 32 33 34 35 36"],
+    ["7E8 10 0A 43 04 01 01 02 02",               # multi-frame DTCs
+     "7E8 21 03 03 04 04 00 00 00"],
+    ["7DF 02 01 00"],                             # functional (echo)
+    ["7E8 06 41 00 be 3f b8 13"],                 # lower case
+]
+
+RESPONSES_29 = [
+    ["18DAF110 06 41 00 BE 3F B8 13"],
+    ["18DAF110 06 41 00 BE 3F B8 13", "18DAF118 06 41 00 98 18 80 10"],
+    ["18DAF110 01 41"],
+    ["18DAF110 10 14 49 02 01 31 44 34",
+     "18DAF110 21 47 50 30 30 52 35 35",
+     "18DAF110 22 42 31 32 33 34 35 36"],
+    ["NO DATA"],
+]
+
+
+def general(protocol, responses):
+    """ parses each response with the per-line parser """
+    results = []
+    for i, lines in enumerate(responses):
+        # non-OBD lines (ie: "NO DATA") aren't part of the batch results
+        messages = [ m for m in protocol(lines) if isHex(m.frames[0].raw) ]
+        compact = [ l.replace(" ", "") for l in lines ]
+        messages.sort(key=lambda m: compact.index(m.frames[0].raw))
+        for m in messages:
+            results.append((i, m.tx_id, m.ecu, bytes(m.data)))
+    return results
+
+
+def batch(protocol, responses, spaced=True):
+    lines = [ l for r in responses for l in r ]
+    if not spaced:
+        lines = [ l.replace(" ", "") for l in lines ]
+    indices = [ i for i, r in enumerate(responses) for l in r ]
+    messages, payload = parse_messages(lines, protocol, indices)
+    return [ (int(m["response"]),
+              int(m["tx_id"]),
+              int(m["ecu"]),
+              payload[m["offset"] : m["offset"] + m["length"]].tobytes()) for m in messages ]
+
+
+@pytest.mark.parametrize("spaced", [True, False])
+def test_matches_general_11bit(spaced):
+    p = ISO_15765_4_11bit_500k(["7E8 06 41 00 BE 3F B8 13"])
+    assert batch(p, RESPONSES_11, spaced) == general(p, RESPONSES_11)
+
+
+@pytest.mark.parametrize("spaced", [True, False])
+def test_matches_general_29bit(spaced):
+    p = ISO_15765_4_29bit_500k(["18DAF110 06 41 00 BE 3F B8 13"])
+    assert batch(p, RESPONSES_29, spaced) == general(p, RESPONSES_29)
+
+
+def test_one_response_per_line():
+    p = ISO_15765_4_11bit_500k([])
+    lines = ["7E8 06 41 00 BE 3F B8 13", "NO DATA", "7E8 03 41 0D 32"]
+    messages, payload = parse_messages(lines, p)
+    assert list(messages["line"]) == [0, 2]
+    assert list(messages["response"]) == [0, 2]
+    assert payload.tobytes() == bytes(bytearray([0x41, 0x00, 0xBE, 0x3F, 0xB8, 0x13, 0x41, 0x0D, 0x32]))
+
+
+def test_frames():
+    p = ISO_15765_4_11bit_500k([])
+    frames = parse_frames(["7E8 10 14 49 02 01 31 44 34",
+                           "7E9 21 47 50 30 30 52 35 35",
+                           "7E8 01",
+                           "NO DATA"], p)
+
+    assert list(frames["valid"]) == [True, True, False, False]
+
+    assert frames[0]["type"] == p.FRAME_TYPE_FF
+    assert frames[0]["data_len"] == 0x14
+    assert frames[0]["tx_id"] == 0
+    assert frames[0]["length"] == 8
+
+    assert frames[1]["type"] == p.FRAME_TYPE_CF
+    assert frames[1]["seq_index"] == 1
+    assert frames[1]["tx_id"] == 1
+    assert list(frames[1]["data"]) == [0x21, 0x47, 0x50, 0x30, 0x30, 0x52, 0x35, 0x35]
+
+
+def test_empty():
+    p = ISO_15765_4_11bit_500k([])
+    messages, payload = parse_messages([], p)
+    assert len(messages) == 0
+    assert len(payload) == 0
+
+
+def test_legacy_rejected():
+    with pytest.raises(ValueError):
+        parse_frames(["48 6B 10 41 00 BE 3F B8 13 FF"], SAE_J1850_PWM([]))
+
+
+def test_payload_rows():
+    p = ISO_15765_4_11bit_500k([])
+    messages, payload = parse_messages(["7E8 04 41 0C 1A F8",
+                                        "7E8 03 41 0D 32",
+                                        "7E8 06 41 0C 01 02 03 04"], p)
+    rows = payload_rows(messages, payload, 4)
+    assert rows.tolist() == [[0x41, 0x0C, 0x1A, 0xF8],
+                             [0x41, 0x0D, 0x32, 0x00],  # padded
+                             [0x41, 0x0C, 0x01, 0x02]]  # chopped
+
+
+@pytest.mark.parametrize("name", ["RPM", "SPEED", "COOLANT_TEMP", "ENGINE_LOAD", "MAF",
+                                  "TIMING_ADVANCE", "O2_S1_WR_CURRENT", "O2_B1S1",
+                                  "EVAP_VAPOR_PRESSURE", "FUEL_INJECT_TIMING",
+                                  "CATALYST_TEMP_B1S1", "EVAP_VAPOR_PRESSURE_ABS"])
+def test_decode_batch(name):
+    cmd = obd.commands[name]
+    rng = np.random.RandomState(0)
+    rows = rng.randint(0, 256, size=(500, cmd.bytes)).astype(np.uint8)
+    rows[:, 0] = 0x40 + cmd.mode
+    rows[:, 1] = cmd.pid
+    rows[::7, 1] ^= 0xFF # answers to another PID
+
+    values, valid = cmd.decode_batch(rows)
+
+    assert list(valid) == [ (i % 7) != 0 for i in range(len(rows)) ]
+    assert np.isnan(values[~valid]).all()
+
+    for row, value in zip(rows[valid], values[valid]):
+        message = Message([])
+        message.data = bytearray(row.tobytes())
+        message.ecu = ECU.ALL
+        assert value == cmd([ message ], units=False).value
+
+
+def test_decode_batch_shapes():
+    cmd = obd.commands.RPM
+    values, valid = cmd.decode_batch([[0x41, 0x0C, 0x1A, 0xF8, 0xFF], # chopped
+                                      [0x41, 0x0C, 0x1A, 0x00, 0x00]])
+    assert values.tolist() == [1726.0, 1664.0]
+
+    values, valid = cmd.decode_batch(np.array([[0x41, 0x0C, 0x1A]], dtype=np.uint8)) # padded
+    assert values.tolist() == [1664.0]
+
+    values, valid = cmd.decode_batch(np.zeros((0, 4), dtype=np.uint8))
+    assert len(values) == 0
+
+    with pytest.raises(ValueError):
+        cmd.decode_batch([0x41, 0x0C, 0x1A, 0xF8])
+
+    with pytest.raises(ValueError):
+        obd.commands.GET_DTC.decode_batch([[0x43, 0x00]])
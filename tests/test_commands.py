@@ -1,6 +1,10 @@
 
+import random
+import itertools
+
 import obd
-from obd.decoders import pid
+from obd.decoders import pid, compile_decoder
+from obd.protocols.protocol import Message
 
 
 def test_list_integrity():
@@ -109,3 +113,44 @@ def test_pid_getters():
 
             if cmd.decode == pid:
                 assert cmd in pid_getters
+
+
+def test_compiled_decoders():
+    # every command that can be compiled matches its decoder
+    rng = random.Random(0)
+    compiled = 0
+    seen = set()
+
+    for mode in obd.commands.modes:
+        for cmd in mode:
+
+            if cmd is None or cmd.bytes == 0:
+                continue
+
+            # mode 02 reuses the mode 01 decoders
+            if (cmd.decode, cmd.bytes) in seen:
+                continue
+            seen.add((cmd.decode, cmd.bytes))
+
+            decode = compile_decoder(cmd.decode, cmd.bytes)
+            if decode is None:
+                continue
+
+            compiled += 1
+            n = cmd.bytes - 2
+
+            if n <= 2:
+                # every possible input
+                inputs = itertools.product(range(256), repeat=n)
+            else:
+                # edge cases, and a sample of the rest
+                inputs = [ [b] * n for b in (0x00, 0x01, 0x7F, 0x80, 0xFF) ]
+                inputs += [ [ rng.randrange(256) for i in range(n) ] for j in range(500) ]
+
+            for data in inputs:
+                message = Message([])
+                message.data = bytearray([0x40, 0x00] + list(data))
+                assert decode([message]) == cmd.decode.raw([message]), \
+                    "%s differs for %s" % (cmd.name, repr(bytes(message.data)))
+
+    assert compiled > 20
@@ -172,20 +172,20 @@ def test_status():
     assert status.ignition_type == "spark"
 
     for name in BASE_TESTS:
-        assert status.__dict__[name].available
-        assert status.__dict__[name].complete
+        assert getattr(status, name).available
+        assert getattr(status, name).complete
 
     # check that NONE of the compression tests are available
     for name in COMPRESSION_TESTS:
         if name and name not in SPARK_TESTS: # there's one test name in common between spark/compression
-            assert not status.__dict__[name].available
-            assert not status.__dict__[name].complete
+            assert not getattr(status, name).available
+            assert not getattr(status, name).complete
 
     # check that ALL of the spark tests are availablex
     for name in SPARK_TESTS:
         if name:
-            assert status.__dict__[name].available
-            assert status.__dict__[name].complete
+            assert getattr(status, name).available
+            assert getattr(status, name).complete
 
     # a different test
     status = d.status(m("4100"+"00790303"))
@@ -206,8 +206,8 @@ def test_status():
     # check that NONE of the spark tests are availablex
     for name in SPARK_TESTS:
         if name and name not in COMPRESSION_TESTS:
-            assert not status.__dict__[name].available
-            assert not status.__dict__[name].complete
+            assert not getattr(status, name).available
+            assert not getattr(status, name).complete
 
     # availability
     assert status.NMHC_CATALYST_MONITORING.available
@@ -261,6 +261,56 @@ def test_dtc():
         ("B0003", ""),
     ]
 
+def test_raw():
+    """ every scaled decoder's plain number matches its Quantity """
+    data = ["00000000", "7F7F7F7F", "FFFFFFFF", "1AF88000", "ABCDEF01"]
+    decoders = [ getattr(d, name) for name in dir(d) ]
+    decoders = [ f for f in decoders if isinstance(getattr(f, "unit", None), str) and f is not d.elm_voltage ]
+    decoders += [ d.uas(id) for id in [0x01, 0x07, 0x09, 0x16, 0x27, 0x34] ]
+    assert len(decoders) > 20
+
+    for decoder in decoders:
+        for hex_data in data:
+            q = decoder(m("4100" + hex_data))
+            v = decoder.raw(m("4100" + hex_data))
+            assert not isinstance(v, Unit.Quantity)
+            assert q == Unit.Quantity(v, decoder.unit)
+
+    assert d.temp.raw(m("4100"+"00")) == -40
+    assert d.uas(0x07).raw(m("4100"+"1AF8")) == 1726
+    assert d.elm_voltage.raw([ Message([Frame("12.875")]) ]) == 12.875
+    assert d.elm_voltage.raw([ Message([Frame("12ABC")]) ]) is None
+
+    v = d.monitor.raw(m("41"+"01010A0BB00BB00BB00105100048000000640185240096004BFFFF"))
+    assert round(v[0x01].value) == 365
+    assert v[0x05].max == 100
+    assert v[0x85].value == 150
+
+
+def test_lazy_results():
+    status = d.status(m("4100"+"8307FF00"))
+    assert not hasattr(status, "__dict__")
+    assert status.MISFIRE_MONITORING is status.MISFIRE_MONITORING # built once
+    assert status.NMHC_CATALYST_MONITORING.name == "" # not a spark test
+    try:
+        status.NOT_A_TEST
+        assert False
+    except AttributeError:
+        pass
+
+    v = d.monitor(m("41"+"01010A0BB00BB00BB00105100048000000640185240096004BFFFF"))
+    assert not hasattr(v, "__dict__")
+    assert not hasattr(v[0x01], "__dict__")
+    assert [ t.tid for t in v.tests ] == [0x01, 0x05, 0x85]
+    assert v.Unknown is v[0x85]
+    assert v.RTL_SWITCH_TIME is v[0x05]
+
+    # unknown Units and Scaling IDs are dropped
+    v = d.monitor(m("41"+"0101FF0BB00BB00BB0"))
+    assert len(v) == 0
+    assert v[0x01].is_null()
+
+
 def test_monitor():
     # single test -----------------------------------------
     #                [      test      ]
@@ -0,0 +1,73 @@
+import io
+import pytest
+
+from obd.codes import DTC
+from obd.dtc import DTCDatabase, DTCTable, GENERIC
+from obd.decoders import parse_dtc
+
+
+def write(path, text):
+    with io.open(str(path), "w", encoding="utf-8") as f:
+        f.write(text)
+    return str(path)
+
+
+def test_generic():
+    assert DTC["P0104"] == "Mass or Volume Air Flow Circuit Intermittent"
+    assert DTC.get("B0003", "") == ""
+    assert "P0001" in DTC
+    assert "P9999" not in DTC
+    assert len(DTC) == 2066
+    assert list(DTC) == sorted(DTC)
+
+    with pytest.raises(KeyError):
+        DTC["P9999"]
+
+    assert parse_dtc((0x01, 0x04)) == ("P0104", "Mass or Volume Air Flow Circuit Intermittent")
+    assert parse_dtc((0x80, 0x03)) == ("B0003", "")
+
+
+def test_lazy():
+    table = DTCTable(GENERIC)
+    assert not table.loaded()
+    assert table.get("P0001") == "Fuel Volume Regulator Control Circuit/Open"
+    assert table.loaded()
+
+    # first and last entries
+    codes = table.codes()
+    assert table.get(codes[0]) is not None
+    assert table.get(codes[-1]) is not None
+    assert table.get("A0000") is None
+    assert table.get("Z9999") is None
+
+
+def test_cache():
+    db = DTCDatabase(cache_size=2)
+    db.get("P0001")
+    db.get("P0001")
+    db.get("P9999")
+    db.get("P9999")
+    assert db.cache.hits == 2
+    assert db.cache.misses == 2
+
+    db.get("P0002")
+    assert len(db.cache) == 2
+    assert "P0001" not in db.cache # least recently used
+
+
+def test_pack(tmp_path):
+    path = write(tmp_path / "dtc_acme.tsv", u"# Acme codes\n"
+                                            u"P1234\tAcme Widget Circuit\n"
+                                            u"P0104\tAcme MAF Intermittent\n"  # out of order
+                                            u"bad line\n")
+    db = DTCDatabase()
+    assert db.get("P1234") is None # cached as missing
+
+    db.add_pack(path)
+    assert db["P1234"] == "Acme Widget Circuit"
+    assert db["P0104"] == "Acme MAF Intermittent" # packs take precedence
+    assert db["P0001"] == DTC["P0001"]
+    assert len(db) == len(DTC) + 1
+
+    with pytest.raises(ValueError):
+        db.add_pack("no_such_manufacturer")
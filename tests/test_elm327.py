@@ -0,0 +1,350 @@
+
+import os
+import pty
+import time
+import tty
+import threading
+import pytest
+
+from obd.elm327 import ELM327, LineFramer, TimeoutTuner
+from obd.utils import OBDStatus
+from obd.protocols import ECU
+
+
+
+class FakeAdapter:
+    """
+        Answers ELM327 commands on one side of a pty.
+
+        "brd" sets how AT BRD is handled: "ok" completes the handshake,
+        "garbled" sends a corrupt ID string at the new baud,
+        and "unsupported" rejects the command.
+
+        Spaces are removed from OBD responses after ATS0,
+        unless "ats0" is False, in which case it's rejected.
+
+        While monitoring (AT MA / AT MP), "bus" lines are sent
+        until the host interrupts.
+
+        "ecus" lists the 0100 responses, which are filtered by ATCRA,
+        and ATCRA is rejected when "cra" is False.
+    """
+
+    IDENT = b"ELM327 v1.5"
+
+    def __init__(self):
+        self.master, slave = pty.openpty()
+        tty.setraw(slave)
+        tty.setraw(self.master)
+        self.name = os.ttyname(slave)
+        self.slave = slave
+        self.brd = "ok"
+        self.ats0 = True
+        self.spaces = True
+        self.commands = []
+        self.bus = []
+        self.ecus = [b"7E8 06 41 00 BE 3E B8 11"]
+        self.cra = True
+        self.receive = None
+
+        t = threading.Thread(target=self.run)
+        t.daemon = True
+        t.start()
+
+    def readline(self):
+        line = b""
+        while not line.endswith(b"\r"):
+            line += os.read(self.master, 1)
+        return line.strip()
+
+    def answer(self, cmd):
+        if cmd in (b"ATZ", b"ATWS"):
+            return b"\r\r" + self.IDENT + b"\r\r>"
+        if cmd == b"ATI":
+            return self.IDENT + b"\r\r>"
+        if cmd == b"ATS0":
+            if not self.ats0:
+                return b"?\r\r>"
+            self.spaces = False
+        if cmd.startswith(b"ATCRA"):
+            if not self.cra:
+                return b"?\r\r>"
+            self.receive = cmd[5:] or None
+        if cmd.startswith(b"AT"):
+            return b"OK\r\r>"
+        if cmd.startswith(b"0100"):
+            lines = [ l for l in self.ecus if self.receive is None or l.startswith(self.receive) ]
+            r = b"\r".join(lines) + b"\r\r>"
+            return r if self.spaces else r.replace(b" ", b"")
+        return b"NO DATA\r\r>"
+
+    def run(self):
+        try:
+            while True:
+                cmd = self.readline()
+                self.commands.append(cmd)
+
+                if cmd.startswith(b"ATMA") or cmd.startswith(b"ATMP"):
+                    for line in self.bus:
+                        os.write(self.master, line + b"\r")
+                    self.readline() # any character stops the monitor
+                    os.write(self.master, b"STOPPED\r\r>")
+                elif not cmd.startswith(b"ATBRD"):
+                    os.write(self.master, self.answer(cmd))
+                elif self.brd == "unsupported":
+                    os.write(self.master, b"?\r\r>")
+                else:
+                    os.write(self.master, b"OK\r")
+                    ident = self.IDENT if self.brd == "ok" else b"\xF8\x00\xFF"
+                    os.write(self.master, ident + b"\r")
+                    if self.brd == "ok":
+                        self.readline() # the host's confirmation
+                        os.write(self.master, b"OK\r\r>")
+                    else:
+                        os.write(self.master, b"\r>") # back at the old baud
+        except OSError:
+            pass # closed
+
+    def close(self):
+        os.close(self.master)
+        os.close(self.slave)
+
+
+@pytest.fixture
+def adapter():
+    a = FakeAdapter()
+    yield a
+    a.close()
+
+
+
+def test_tuner_defaults():
+    t = TimeoutTuner()
+    assert t.timeout == TimeoutTuner.DEFAULT
+    assert t.history == []
+
+    # not enough samples to make a decision
+    t.record(b"010C", 0.010, 0.020, [0])
+    assert t.tighten() == TimeoutTuner.DEFAULT
+
+
+def test_tuner_tighten():
+    t = TimeoutTuner()
+
+    for i in range(TimeoutTuner.SAMPLES):
+        t.record(b"010C", 0.040, 0.050, [0])
+
+    # 40ms * 1.5 margin = 60ms, or 15 units of 4.096ms (rounded up)
+    value = t.tighten()
+    assert value == 15
+    t.chose(value)
+
+    assert t.timeout == 15
+    assert len(t.history) == 1
+
+    stats = t.stats()
+    assert stats["timeout"] == 15
+    assert stats["commands"][b"010C"]["count"] == TimeoutTuner.SAMPLES
+    assert round(stats["commands"][b"010C"]["round_trip_ms"]) == 50
+    assert round(stats["ecus"][0]) == 40
+
+    # never tightens past the minimum
+    for i in range(TimeoutTuner.SAMPLES):
+        t.record(b"010C", 0.0001, 0.001, [0])
+    assert t.tighten() == TimeoutTuner.MINIMUM
+
+
+def test_tuner_backoff():
+    t = TimeoutTuner()
+
+    for i in range(TimeoutTuner.SAMPLES):
+        t.record(b"010C", 0.040, 0.050, [0])
+    t.chose(t.tighten())
+
+    # NO DATA from an unknown command is ignored
+    assert t.backoff(b"0199") == 15
+
+    # NO DATA from a command that has answered before doubles the timeout
+    value = t.backoff(b"010C")
+    assert value == 30
+    t.chose(value)
+
+    # and holds it until a fresh set of samples arrive
+    t.record(b"010C", 0.040, 0.050, [0])
+    assert t.tighten() == 30
+
+    for i in range(TimeoutTuner.SAMPLES):
+        t.record(b"010C", 0.040, 0.050, [0])
+    assert t.tighten() == 15
+
+    # capped at the largest value the ELM accepts
+    t.chose(TimeoutTuner.MAXIMUM)
+    assert t.backoff(b"010C") == TimeoutTuner.MAXIMUM
+
+
+def test_tuner_unsupported(adapter):
+    """ a PID that never answers doesn't push the timeout up """
+    elm = ELM327(adapter.name, 38400, "6", tune_timeout=True)
+    assert elm.status() == OBDStatus.CAR_CONNECTED
+
+    for i in range(10):
+        elm.send_and_parse(b"0199") # answered with NO DATA
+
+    assert elm.timeout_stats()["timeout"] == TimeoutTuner.DEFAULT
+    assert not any(c.startswith(b"ATST") for c in adapter.commands)
+    elm.close()
+
+
+
+def test_framer():
+    f = LineFramer()
+
+    # bytes arrive in arbitrary chunks
+    assert not f.feed(b"7E8 06 41 00 ")
+    assert f.pop_lines() == []
+    assert not f.feed(b"BE 3F A8 13\r7E9 06")
+    assert f.pop_lines() == ["7E8 06 41 00 BE 3F A8 13"]
+    assert f.feed(b" 41 00 80 00 00 01 \r\r>")
+    assert f.pop_lines() == ["7E9 06 41 00 80 00 00 01"]
+    assert len(f.times) == 2
+
+    # anything after the prompt is ignored
+    assert f.feed(b"junk")
+    assert f.pop_lines() == []
+
+
+def test_framer_cleanup():
+    f = LineFramer()
+    f.feed(b"\x00SEARCHING...\r\n\x00UNABLE TO CONNECT\r\n\r\n>")
+    assert f.pop_lines() == ["SEARCHING...", "UNABLE TO CONNECT"]
+
+    # a response cut short still returns its last line
+    f = LineFramer()
+    f.feed(b"7E8 03 41 0D 3C\r7E8 04 41")
+    f.finish()
+    assert f.pop_lines() == ["7E8 03 41 0D 3C", "7E8 04 41"]
+
+    assert ELM327.split_lines(b"OK\r\r>") == ["OK"]
+
+
+def test_upshift(adapter):
+    elm = ELM327(adapter.name, 38400, "6")
+    assert elm.status() == OBDStatus.CAR_CONNECTED
+    assert elm.baudrate() == 38400
+
+    # rejected, nothing else is tried
+    adapter.brd = "unsupported"
+    del adapter.commands[:]
+    assert elm.upshift_baudrate(230400) is None
+    assert adapter.commands == [b"ATI", b"ATBRD11"]
+    assert elm.baudrate() == 38400
+
+    # the ID string didn't survive the switch, roll back
+    adapter.brd = "garbled"
+    del adapter.commands[:]
+    assert elm.upshift_baudrate(230400) is None
+    assert adapter.commands[:4] == [b"ATI", b"ATBRD11", b"\x7F\x7F", b"ATBRD23"]
+    assert elm.baudrate() == 38400
+
+    # bauds above the limit are skipped
+    adapter.brd = "ok"
+    del adapter.commands[:]
+    assert elm.upshift_baudrate(230400) == 230400
+    assert adapter.commands[1] == b"ATBRD11"
+    assert elm.baudrate() == 230400
+    assert elm.boot_baudrate() == 38400
+
+    # the connection still works at the new baud
+    assert elm.send_and_parse(b"0100")[0].data[0] == 0x41
+
+
+@pytest.mark.parametrize("ats0", [True, False])
+def test_spaces_off(adapter, ats0):
+    adapter.ats0 = ats0
+    elm = ELM327(adapter.name, 38400, "6")
+    assert elm.status() == OBDStatus.CAR_CONNECTED
+    assert b"ATS0" in adapter.commands
+    assert adapter.spaces == (not ats0)
+
+    # responses parse the same, with or without spaces
+    messages = elm.send_and_parse(b"0100")
+    assert len(messages) == 1
+    assert messages[0].data == bytearray([0x41, 0x00, 0xBE, 0x3E, 0xB8, 0x11])
+
+
+@pytest.mark.parametrize("reset, sent", [("full", b"ATZ"), ("warm", b"ATWS"), ("none", None)])
+def test_reset(adapter, reset, sent):
+    t = time.time()
+    elm = ELM327(adapter.name, 38400, "6", reset=reset)
+    assert elm.status() == OBDStatus.CAR_CONNECTED
+
+    # the prompt is waited for, rather than sleeping through the reset
+    assert time.time() - t < 1
+
+    if sent is None:
+        assert adapter.commands[0] == b"ATE0"
+    else:
+        assert adapter.commands[:2] == [sent, b"ATE0"]
+
+    stats = elm.startup_stats()
+    assert 0 <= stats["reset"] <= stats["first_response"] <= stats["car"]
+
+
+def test_monitor(adapter):
+    adapter.bus = [b"18FEF100FFFF0012FFFFFFFF", b"18F00400F07D7D001AFFFFFF", b"BUS BUSY"]
+    elm = ELM327(adapter.name, 38400, "A")
+    assert elm.status() == OBDStatus.CAR_CONNECTED
+
+    del adapter.commands[:]
+    stream = elm.monitor(0xFEF1)
+    lines = [next(stream) for i in range(3)]
+    stream.close()
+
+    assert lines == ["18FEF100FFFF0012FFFFFFFF", "18F00400F07D7D001AFFFFFF", "BUS BUSY"]
+    assert adapter.commands[:2] == [b"ATJHF0", b"ATMPFEF1"]
+
+    # the monitor was stopped, and the adapter answers normally again
+    assert elm.send_and_parse(b"0100") is not None
+    assert adapter.commands[-1] == b"0100"
+
+
+def test_target(adapter):
+    adapter.ecus = [b"7E8 06 41 00 BE 3E B8 11", b"7E9 06 41 00 80 00 00 01"]
+    elm = ELM327(adapter.name, 38400, "6")
+    assert elm.status() == OBDStatus.CAR_CONNECTED
+    assert len(elm.send_and_parse(b"0100")) == 2
+
+    del adapter.commands[:]
+    elm.set_target(ECU.ENGINE)
+    assert adapter.commands == [b"ATSH7E0", b"ATCRA7E8"]
+    r = elm.send_and_parse(b"0100")
+    assert len(r) == 1
+    assert r[0].ecu == ECU.ENGINE
+
+    # nothing is sent while the target stays the same
+    del adapter.commands[:]
+    elm.set_target(ECU.ENGINE)
+    assert adapter.commands == []
+
+    elm.set_target(ECU.TRANSMISSION)
+    assert adapter.commands == [b"ATSH7E1", b"ATCRA7E9"]
+
+    # back to functional requests
+    del adapter.commands[:]
+    elm.set_target(ECU.ALL)
+    assert adapter.commands == [b"ATSH7DF", b"ATCRA"]
+    assert len(elm.send_and_parse(b"0100")) == 2
+
+
+def test_target_rejected(adapter):
+    adapter.cra = False
+    elm = ELM327(adapter.name, 38400, "6")
+
+    del adapter.commands[:]
+    elm.set_target(ECU.ENGINE)
+    assert adapter.commands == [b"ATSH7E0", b"ATCRA7E8", b"ATSH7DF", b"ATCRA"]
+
+    # and isn't tried again
+    del adapter.commands[:]
+    elm.set_target(ECU.ENGINE)
+    assert adapter.commands == []
@@ -0,0 +1,56 @@
+import os
+import sys
+import json
+import subprocess
+import pytest
+
+
+# seconds allowed for "import obd", on top of the interpreter's startup
+IMPORT_BUDGET = 0.25
+
+# modules that are only loaded once they're needed
+HEAVY_MODULES = ["pint", "serial", "asyncio", "numpy", "json"]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPT = """
+import sys, time
+before = set(sys.modules)
+t = time.time()
+import obd
+t = time.time() - t
+modules = sorted(set(sys.modules) - before)
+import json
+print(json.dumps({ "time" : t, "modules" : modules }))
+"""
+
+
+def import_obd():
+    out = subprocess.check_output([sys.executable, "-c", SCRIPT], cwd=ROOT)
+    return json.loads(out.decode())
+
+
+def test_lazy_modules():
+    modules = import_obd()["modules"]
+    for name in HEAVY_MODULES:
+        assert name not in modules, "'import obd' loaded %s" % name
+
+
+def test_import_budget(request):
+    # wall-clock timing is only reliable on an idle machine, so it's opt-in
+    if not request.config.getoption("--benchmark"):
+        pytest.skip("timing checks need --benchmark")
+
+    # best of a few runs, to ignore the odd slow one
+    t = min([ import_obd()["time"] for i in range(3) ])
+    assert t < IMPORT_BUDGET, "'import obd' took %.3f seconds" % t
+
+
+def test_lazy_attributes():
+    import obd
+    assert callable(obd.OBD)
+    try:
+        obd.NOT_AN_ATTRIBUTE
+        assert False
+    except AttributeError:
+        pass
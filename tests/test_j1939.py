@@ -0,0 +1,85 @@
+from obd.j1939 import parse_id, parse_line, SPNS, PGN_NAMES, J1939Message
+from obd.UnitsAndScaling import Unit
+
+
+def test_parse_id():
+    # PDU2 (broadcast), the PS byte is part of the PGN
+    assert parse_id(0x18FEF100) == (6, 0xFEF1, 0x00)
+    assert parse_id(0x0CF00400) == (3, 0xF004, 0x00)
+    assert parse_id(0x18FEEE17) == (6, 0xFEEE, 0x17)
+
+    # PDU1 (addressed), the PS byte is the destination
+    assert parse_id(0x18EAFF00) == (6, 0xEA00, 0x00)
+    assert parse_id(0x18EA0017) == (6, 0xEA00, 0x17)
+
+    # data page
+    assert parse_id(0x19FEF100) == (6, 0x1FEF1, 0x00)
+
+
+def test_parse_line():
+    m = parse_line("18F00400F07D7D001AFFFFFF")
+    assert isinstance(m, J1939Message)
+    assert m.priority == 6
+    assert m.pgn == 0xF004
+    assert m.source == 0x00
+    assert m.data == bytearray([0xF0, 0x7D, 0x7D, 0x00, 0x1A, 0xFF, 0xFF, 0xFF])
+    assert m.name == "EEC1"
+
+    # spaces are optional
+    assert parse_line("18 F0 04 00 F0 7D 7D 00 1A FF FF FF").data == m.data
+
+    # not frames
+    assert parse_line("BUFFER FULL") is None
+    assert parse_line("18F004") is None
+    assert parse_line("18F00400F07D7D001AFFFFFF00") is None
+    assert parse_line("18F00400F07") is None
+
+
+def test_values():
+    # EEC1: 0x1A00 * 0.125 = 832 rpm, torques of 0%
+    values = parse_line("18F00400F07D7D001AFFFFFF").values
+    assert values["ENGINE_SPEED"] == 832 * Unit.rpm
+    assert values["ACTUAL_ENGINE_TORQUE"] == 0 * Unit.percent
+    assert values["DRIVER_DEMAND_TORQUE"] == 0 * Unit.percent
+
+    # ET1: 90 C coolant, oil temp 0x2620 * 0.03125 - 273 = 32 C
+    values = parse_line("18FEEE00824B2026FFFFFFFF").values
+    assert values["COOLANT_TEMP"] == Unit.Quantity(90, Unit.celsius)
+    assert values["FUEL_TEMP"] == Unit.Quantity(35, Unit.celsius)
+    assert values["OIL_TEMP"] == Unit.Quantity(32, Unit.celsius)
+
+    # CCVS: 0x3200 / 256 = 50 kph
+    values = parse_line("18FEF100FF0032FFFFFFFFFF").values
+    assert values["WHEEL_BASED_SPEED"] == 50 * Unit.kph
+
+
+def test_values_raw():
+    # plain numbers, in the SPN's unit
+    values = parse_line("18FEEE00824B2026FFFFFFFF", units=False).values
+    assert values == { "COOLANT_TEMP" : 90, "FUEL_TEMP" : 35, "OIL_TEMP" : 32 }
+    assert parse_line("18FEEE00FFFEFFFFFFFFFFFF", units=False).values["COOLANT_TEMP"] is None
+
+
+def test_not_available():
+    # all FF is "not available", FE is "error"
+    values = parse_line("18FEEE00FFFEFFFFFFFFFFFF").values
+    assert values["COOLANT_TEMP"] is None
+    assert values["FUEL_TEMP"] is None
+    assert values["OIL_TEMP"] is None
+
+    # short messages don't carry the later SPNs
+    values = parse_line("18FEEE0082").values
+    assert values["COOLANT_TEMP"] == Unit.Quantity(90, Unit.celsius)
+    assert values["OIL_TEMP"] is None
+
+    # unknown PGNs have no values
+    assert parse_line("18FEDA0000").values == {}
+
+
+def test_tables():
+    for pgn, spns in SPNS.items():
+        assert pgn in PGN_NAMES
+        for spn in spns:
+            assert spn.pgn == pgn
+            assert 1 <= spn.start <= 8
+            assert spn.start - 1 + spn.length <= 8
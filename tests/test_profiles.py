@@ -0,0 +1,63 @@
+import os
+from obd.protocols.protocol import Message
+from obd.profiles import ProfileStore, decode_vin
+
+
+VIN = "1D4GP00R55B123456"
+
+ECUS = { "2024" : { "ecu" : 2, "0100" : "4100be3eb811" } }
+
+
+def test_decode_vin():
+    # CAN: 49 02 [count] [17 chars]
+    m = Message([])
+    m.data = bytearray([0x49, 0x02, 0x01]) + bytearray(VIN.encode())
+    assert decode_vin([m]) == VIN
+
+    # legacy: 49 02 [] 00 00 00 [17 chars]
+    m.data = bytearray([0x49, 0x02, 0x00, 0x00, 0x00]) + bytearray(VIN.encode())
+    assert decode_vin([m]) == VIN
+
+    # no answer, or a different command
+    m.data = bytearray([0x41, 0x00, 0xBE, 0x3E, 0xB8, 0x11])
+    assert decode_vin([m]) == ""
+    assert decode_vin(None) == ""
+
+
+def test_profile_store(tmpdir):
+    path = str(tmpdir.join("profiles.json"))
+    store = ProfileStore(path)
+
+    assert store.ports() == []
+    assert store.latest("/dev/ttyUSB0") is None
+    assert store.find("/dev/ttyUSB0", "6", ECUS) == (None, None)
+
+    store.save("/dev/ttyUSB0", VIN, { "protocol" : "6", "ecus" : ECUS, "baudrate" : 38400 })
+    store.save("/dev/ttyUSB1", "", { "protocol" : "3", "ecus" : {}, "baudrate" : 9600 })
+
+    # a new store reads the same file
+    store = ProfileStore(path)
+    assert store.ports() == ["/dev/ttyUSB1", "/dev/ttyUSB0"]
+    assert store.latest("/dev/ttyUSB0")["baudrate"] == 38400
+
+    vin, profile = store.find("/dev/ttyUSB0", "6", ECUS)
+    assert vin == VIN
+    assert profile["baudrate"] == 38400
+
+    # the car must give the same answers on the same protocol
+    assert store.find("/dev/ttyUSB0", "7", ECUS) == (None, None)
+    assert store.find("/dev/ttyUSB0", "6", {}) == (None, None)
+
+
+def test_profile_store_unreadable(tmpdir):
+    path = str(tmpdir.join("profiles.json"))
+    with open(path, "w") as f:
+        f.write("{ not json")
+
+    store = ProfileStore(path)
+    assert store.ports() == []
+
+    # the broken file is replaced
+    store.save("/dev/ttyUSB0", VIN, { "protocol" : "6", "ecus" : ECUS })
+    assert store.ports() == ["/dev/ttyUSB0"]
+    assert not os.path.exists(path + ".tmp")
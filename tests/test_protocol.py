@@ -30,6 +30,9 @@ def test_frame():
     assert frame.seq_index == 0
     assert frame.data_len  == None
 
+    # frames are slotted, to keep them small
+    assert not hasattr(frame, "__dict__")
+
 
 def test_message():
 
@@ -47,6 +50,7 @@ def test_message():
     assert message.tx_id == 42 # this is dynamically read from the first frame
 
     assert Message([]).tx_id == None # if no frames are given, then we can't report a tx_id
+    assert not hasattr(message, "__dict__")
 
 
 def test_message_hex():
@@ -78,3 +82,18 @@ def test_populate_ecu_map():
     # if no messages were received, then the map is empty
     p = SAE_J1850_PWM([])
     assert len(p.ecu_map) == 0
+
+
+def test_spaced():
+    p = SAE_J1850_PWM(["48 6B 10 41 00 BE 1F B8 11 AA"])
+    assert p.spaced
+
+    # lines without spaces are always accepted
+    r = p(["486B104100BE1FB811AA", "NO DATA"])
+    assert r[0].data == bytearray([0x41, 0x00, 0xBE, 0x1F, 0xB8, 0x11])
+    assert r[1].raw() == "NO DATA"
+
+    # once spaces are turned off, lines aren't scrubbed
+    p.spaced = False
+    r = p(["486B104100BE1FB811AA"])
+    assert r[0].data == bytearray([0x41, 0x00, 0xBE, 0x1F, 0xB8, 0x11])
@@ -1,7 +1,8 @@
 
 import random
 from obd.protocols import *
-from obd.protocols.protocol import Message
+from obd.protocols.protocol import Message, Frame
+from obd.protocols.protocol_can import ISOTPReassembler
 
 
 CAN_11_PROTOCOLS = [
@@ -201,5 +202,128 @@ def test_multi_line_mode_03():
         check_message(r[0], len(test_case), 0, correct_data)
 
 
+def test_multi_line_long():
+    """ sequence indices roll over after F, and the length is 12 bits """
+
+    for protocol in CAN_11_PROTOCOLS:
+        p = protocol([])
+
+        n = 0x123
+        test_case = ["7E8 11 23 49 02 01 00 01 02"]
+        data = [0x49, 0x02, 0x01, 0x00, 0x01, 0x02]
+        i = 1
+        while len(data) < n:
+            chunk = [ (i + k) & 0xFF for k in range(7) ]
+            test_case.append("7E8 2%X " % (i & 0x0F) + " ".join([ "%02X" % b for b in chunk ]))
+            data += chunk
+            i += 1
+
+        r = p(test_case)
+        assert len(r) == 1
+        check_message(r[0], len(test_case), 0x0, data[:n])
+
+
+def test_isotp_reassembler():
+    """ frames can be fed one at a time, and completion is reported early """
+
+    p = ISO_15765_4_11bit_500k([])
+
+    def frame(raw):
+        f = Frame(raw)
+        assert p.parse_frame(f)
+        return f
+
+    ff  = frame("7E81014490201314434")
+    cf1 = frame("7E82147503030523535")
+    cf2 = frame("7E82242313233343536")
+
+    # in order
+    r = ISOTPReassembler()
+    assert not r.feed(ff)
+    assert r.length == 0x14
+    assert len(r.data) == 0x14 # preallocated
+    assert not r.feed(cf1)
+    assert r.feed(cf2)
+    assert r.complete
+    assert r.result() == bytearray(b"I\x02\x011D4GP00R55B123456")
+
+    # CFs before the FF
+    ff  = frame("7E81014490201314434")
+    cf1 = frame("7E82147503030523535")
+    cf2 = frame("7E82242313233343536")
+    r = ISOTPReassembler()
+    assert not r.feed(cf2)
+    assert not r.feed(cf1)
+    assert r.feed(ff)
+    assert r.result() == bytearray(b"I\x02\x011D4GP00R55B123456")
+
+    # duplicate CF
+    ff  = frame("7E81014490201314434")
+    cf1 = frame("7E82147503030523535")
+    r = ISOTPReassembler()
+    r.feed(ff)
+    r.feed(cf1)
+    r.feed(frame("7E82147503030523535"))
+    assert not r.complete
+    assert r.result() is None
+
+    # no CF
+    r = ISOTPReassembler()
+    r.feed(frame("7E81014490201314434"))
+    assert r.result() is None
+
+
 def test_can_29():
     pass
+
+
+FRAME_ATTRS = ["raw", "data", "priority", "addr_mode", "rx_id", "tx_id", "type", "seq_index", "data_len"]
+
+def test_single_frame_fast_path():
+    """ the single-line fast path must agree with the general parser """
+
+    lines_11 = [
+        "7E8 06 41 00 00 01 02 03",
+        "7E9 03 41 0C 1A",
+        "7E8 01 41",
+        "7E8 06 41 00 00 01 02 03 04 05", # too long
+        "7E8 00 41 00",                   # zero length
+        "7E8 43 02 01 00 02 00",          # DTCs
+        "7E8 10 14 49 02 01 31 44 34",    # a lone FF
+        "7DF 02 01 00",                   # a request
+        "7E0 02 01 00",                   # tester
+        "7E8 06 41 00 00 01 02 0",        # odd
+        "NO DATA",
+        "",
+    ]
+
+    lines_29 = [
+        "18 DA F1 10 06 41 00 00 01 02 03",
+        "18 DA F1 18 03 41 0C 1A",
+        "18 DA F1 10 10 14 49 02 01 31 44 34",
+        "18 DA F1 10 01",
+        "SEARCHING...",
+    ]
+
+    for protocols, lines in [(CAN_11_PROTOCOLS, lines_11), (CAN_29_PROTOCOLS, lines_29)]:
+        for protocol in protocols:
+            fast = protocol([])
+            general = protocol([])
+            general.parse_single = lambda line: None
+
+            for spaced in [True, False]:
+                fast.spaced = general.spaced = spaced
+                for line in lines:
+                    if not spaced:
+                        line = line.replace(" ", "")
+
+                    a = fast([line])
+                    b = general([line])
+
+                    assert len(a) == len(b)
+                    for m, n in zip(a, b):
+                        assert m.data == n.data
+                        assert m.ecu == n.ecu
+                        assert len(m.frames) == len(n.frames)
+                        for attr in FRAME_ATTRS:
+                            assert getattr(m.frames[0], attr) == getattr(n.frames[0], attr)
@@ -185,3 +185,43 @@ def test_multi_line_mode_03():
         r = p(test_case)
         assert len(r) == 1
         check_message(r[0], len(test_case), 0x10, correct_data)
+
+
+FRAME_ATTRS = ["raw", "data", "priority", "addr_mode", "rx_id", "tx_id", "type", "seq_index", "data_len"]
+
+def test_single_frame_fast_path():
+    """ the single-line fast path must agree with the general parser """
+
+    lines = [
+        "48 6B 10 41 00 FF",
+        "48 6B 12 41 0C 1A F8 AA",
+        "48 6B 10 41 00 00 01 02 03 04 05 FF",   # too long
+        "48 6B 10 41 FF",                         # too short
+        "48 6B 10 43 01 00 02 00 03 00 FF",       # DTCs
+        "48 6B 10 49 02 01 00 00 00 31 FF",       # a lone frame of a VIN
+        "48 6B 10 41 00 0",                       # odd
+        "NO DATA",
+        "",
+    ]
+
+    for protocol in LEGACY_PROTOCOLS:
+        fast = protocol([])
+        general = protocol([])
+        general.parse_single = lambda line: None
+
+        for spaced in [True, False]:
+            fast.spaced = general.spaced = spaced
+            for line in lines:
+                if not spaced:
+                    line = line.replace(" ", "")
+
+                a = fast([line])
+                b = general([line])
+
+                assert len(a) == len(b)
+                for m, n in zip(a, b):
+                    assert m.data == n.data
+                    assert m.ecu == n.ecu
+                    assert len(m.frames) == len(n.frames)
+                    for attr in FRAME_ATTRS:
+                        assert getattr(m.frames[0], attr) == getattr(n.frames[0], attr)
@@ -0,0 +1,87 @@
+
+import time
+from obd.utils import run_parallel, bitarray, LRUCache
+
+
+
+def test_run_parallel():
+    def even(n):
+        return (n % 2) == 0
+
+    found = run_parallel(even, list(range(10)), timeout=5)
+    assert sorted([ n for n, r in found ]) == [0, 2, 4, 6, 8]
+
+    # exceptions count as failures
+    def broken(n):
+        raise OSError("no such port")
+
+    assert run_parallel(broken, [1, 2, 3], timeout=5) == []
+
+
+def test_run_parallel_first():
+    def slow(n):
+        time.sleep(n)
+        return "found %d" % n
+
+    # returns as soon as one call succeeds
+    t = time.time()
+    found = run_parallel(slow, [2, 0, 2], timeout=5, first=True)
+    assert found == [(0, "found 0")]
+    assert time.time() - t < 1
+
+
+def test_run_parallel_timeout():
+    def slow(n):
+        time.sleep(n)
+        return True
+
+    t = time.time()
+    found = run_parallel(slow, [0, 2], timeout=0.5)
+    assert found == [(0, True)]
+    assert time.time() - t < 1.5
+
+
+def test_bitarray():
+    data = bytearray([0xF0, 0x0A, 0xA0, 0x0F])
+    bits = bitarray(data)
+    reference = "11110000000010101010000000001111"
+
+    assert len(bits) == 32
+    assert str(bits) == bits.bits == reference
+    assert list(bits) == [ b == "1" for b in reference ]
+    assert bits.num_set() == reference.count("1")
+    assert bits.num_cleared() == reference.count("0")
+
+    for i in range(-2, 34):
+        assert bits[i] == (0 <= i < 32 and reference[i] == "1")
+
+    for start, stop in [(0, 8), (4, 12), (1, 8), (9, 32), (0, 32), (30, 40), (8, 8), (12, 4)]:
+        assert bits[start:stop] == [ b == "1" for b in reference[start:stop] ]
+        assert bits.value(start, stop) == int(reference[start:stop] or "0", 2)
+
+    assert bits[::3] == [ b == "1" for b in reference[::3] ]
+    assert bits[-4:] == [True] * 4
+
+    empty = bitarray(bytearray())
+    assert len(empty) == 0
+    assert str(empty) == ""
+    assert list(empty) == []
+    assert empty[0] is False
+    assert empty.value(0, 8) == 0
+
+
+def test_lru_cache():
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1 # "a" is now the most recent
+    cache.put("c", 3)
+    assert "b" not in cache
+    assert cache.get("b", "missing") == "missing"
+    assert cache.get("c") == 3
+    assert len(cache) == 2
+    assert (cache.hits, cache.misses) == (2, 1)
+
+    cache.clear()
+    assert len(cache) == 0
+    assert (cache.hits, cache.misses) == (0, 0)